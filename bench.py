@@ -0,0 +1,246 @@
+# Kontrol hattı için yerel benchmark.
+# Kayıtlı (veya sentetik) Zara sayfalarını yerel bir HTTP sunucusundan servis eder,
+# check_stock / create_ui / check_job'u sahte bir Telegram botuyla çalıştırıp
+# aşama sürelerini, dakikadaki ürün sayısını ve tepe bellek kullanımını raporlar.
+#
+#   python bench.py                         # sentetik sayfalar, HTTP motoru
+#   python bench.py --engine selenium       # Chrome ile
+#   python bench.py --pages kayitli_sayfalar --rounds 3
+#   python bench.py --pages tests/fixtures/pages   # testlerdeki kayıtlı Zara sayfaları
+#   python bench.py --compare-blocking --url https://www.zara.com/tr/tr/...-p0123.html
+#   python bench.py --startup               # çökme sonrası yeniden açılış süresi
+import argparse
+import asyncio
+import functools
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+os.environ.setdefault('TIMING', '1')
+import bot  # noqa: E402
+
+SIZES = [("XS", "in_stock"), ("S", "out_of_stock"), ("M", "in_stock"), ("L", "back_soon"), ("XL", "in_stock")]
+
+def synthetic_page(i: int) -> str:
+    payload = {'product': {'name': f'SATEN ELBİSE {i}', 'detail': {'colors': [{
+        'productId': i, 'price': 129900,
+        'sizes': [{'name': n, 'availability': a} for n, a in SIZES]}]}}}
+    items = "".join(
+        f"<li class=\"size-selector-sizes__size{'' if a == 'in_stock' else ' is-disabled'}\">"
+        f"<div data-qa-qualifier=\"size-selector-sizes-size-label\">{n}</div></li>" for n, a in SIZES)
+    return f"""<!DOCTYPE html><html><head>
+<meta property="og:image" content="http://127.0.0.1/img/{i}.jpg?ts=1">
+</head><body>
+<h1>SATEN ELBİSE {i}</h1><span class="money-amount">1.299,00 TL</span>
+<button data-qa-action="add-to-cart">Ekle</button><ul>{items}</ul>
+<script>window.zara.viewPayload = {json.dumps(payload)};</script>
+</body></html>"""
+
+def write_synthetic_pages(folder: str, count: int):
+    for i in range(count):
+        with open(os.path.join(folder, f"urun-p{i:08d}.html"), "w", encoding="utf-8") as f:
+            f.write(synthetic_page(i))
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args): pass
+
+def serve(folder: str) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(QuietHandler, directory=folder))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+class StubBot:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.sent = 0
+
+    async def _send(self, *args, **kwargs):
+        await asyncio.sleep(self.latency)
+        self.sent += 1
+        return None
+
+    send_message = send_photo = send_chat_action = set_my_commands = _send
+
+class StubContext:
+    def __init__(self, stub: StubBot):
+        self.bot = stub
+
+class StubMessage:
+    def __init__(self, stub: StubBot):
+        self.stub = stub
+
+    async def reply_text(self, *args, **kwargs):
+        return await self.stub._send()
+
+class StubUser:
+    id, first_name, username = 1, 'bench', None
+
+class StubUpdate:
+    def __init__(self, stub: StubBot):
+        self.effective_user = StubUser()
+        self.message = self.effective_message = StubMessage(stub)
+        self.callback_query = None
+
+async def run(args, urls):
+    report = {'engine': bot.FETCH_ENGINE, 'pages': len(urls)}
+
+    # 1) Tek tek ürün kontrolü
+    started = time.perf_counter()
+    ok = 0
+    for _ in range(args.rounds):
+        for url in urls:
+            data = await bot.check_stock(url)
+            ok += data['status'] == 'success'
+    elapsed = time.perf_counter() - started
+    checks = len(urls) * args.rounds
+    report['check_stock'] = {'checks': checks, 'success': ok, 'seconds': round(elapsed, 2),
+                             'products_per_minute': round(checks / elapsed * 60, 1)}
+
+    # 2) Mesaj metni üretimi
+    started = time.perf_counter()
+    for _ in range(1000): bot.create_ui(data, urls[0], ['XS', 'M'])
+    report['create_ui_ms'] = round((time.perf_counter() - started), 3)
+
+    # 3) Tam kontrol turu (takip eden başına bildirim dahil)
+    stub = StubBot(args.send_latency)
+    bot.store = bot.Store(':memory:')
+    bot.poll_scheduler = bot.PollScheduler(bot.CHECK_INTERVAL, bot.MIN_CHECK_INTERVAL, bot.MAX_CHECK_INTERVAL, 10 ** 6)
+    bot.tracked_products.clear()
+    for i, url in enumerate(urls):
+        for u in range(args.subscribers):
+            bot.tracked_products[f"{u}_{i}"] = {
+                'url': url, 'name': '-', 'price': '-', 'image': None, 'last_status': 'out_of_stock',
+                'target_sizes': ['HEPSI'], 'chat_id': u, 'user_id': str(u), 'category': 'clothing'}
+    started = time.perf_counter()
+    await bot.check_job(StubContext(stub))
+    await bot.notifier.join()
+    elapsed = time.perf_counter() - started
+    report['check_job'] = {'subscriptions': len(bot.tracked_products), 'unique': bot.last_cycle.get('unique'),
+                           'seconds': round(elapsed, 2), 'notifications': stub.sent,
+                           'products_per_minute': round(len(urls) / elapsed * 60, 1)}
+
+    if bot.http_client: await bot.http_client.aclose()
+    bot.driver_pool.close()
+    return report
+
+# Açılış: taze süreçte import süresi + kayıtlı durumla post_init, ilk /start ve ilk kontrol turu
+IMPORT_PROBE = (
+    "import json, sys, time; t = time.perf_counter(); import bot; a = time.perf_counter() - t; "
+    "s = 'selenium' in sys.modules; bot.load_selenium(); "
+    "print(json.dumps({'import_s': round(a, 3), 'selenium_at_import': s, 'load_selenium_s': round(time.perf_counter() - t - a, 3)}))"
+)
+
+def measure_import(db_path: str) -> dict:
+    env = dict(os.environ, DB_PATH=db_path)
+    out = subprocess.run([sys.executable, "-c", IMPORT_PROBE], cwd=os.path.dirname(os.path.abspath(bot.__file__)),
+                         env=env, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+async def run_startup(args, urls, base: str, db_path: str):
+    seed = bot.Store(db_path)
+    seed.save_products({f"{u}_{i}": {
+        'url': url, 'name': '-', 'price': '-', 'image': None, 'last_status': 'out_of_stock',
+        'target_sizes': ['HEPSI'], 'chat_id': u, 'user_id': str(u), 'category': 'clothing'}
+        for i, url in enumerate(urls) for u in range(args.subscribers)})
+    seed.close()
+
+    stub = StubBot(args.send_latency)
+    bot.tracked_products.clear()
+    bot.startup_marks.clear()
+    bot.WARM_URL = base + "/"
+    bot.BOOT_STARTED = time.perf_counter()
+    bot.store = bot.Store(db_path)
+    await bot.post_init(StubContext(stub))
+    await bot.start(StubUpdate(stub), None)
+    bot.mark_startup('first_update')
+    await bot.check_job(StubContext(stub))
+    await bot.notifier.join()
+    if bot.warm_task: await bot.warm_task
+    report = {'restored_products': len(bot.tracked_products), 'marks': dict(bot.startup_marks)}
+    await bot.post_shutdown(None)
+    return report
+
+# Kaynak engelleme açık/kapalı: sayfa başına aktarılan bayt ve yükleme süresi
+TRANSFER_SCRIPT = """
+return performance.getEntriesByType('navigation').concat(performance.getEntriesByType('resource'))
+    .reduce(function (total, e) { return total + (e.transferSize || 0); }, 0);
+"""
+
+def compare_blocking(urls, rounds: int):
+    report = {}
+    blocked = bot.blocked_url_patterns() or [p for group in bot.RESOURCE_BLOCKLIST.values() for p in group]
+    for label, patterns in (('off', []), ('on', blocked)):
+        driver = bot.get_driver()
+        try:
+            driver.execute_cdp_cmd('Network.enable', {})
+            driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': patterns})
+            loads, transferred = [], []
+            for _ in range(rounds):
+                for url in urls:
+                    driver.execute_cdp_cmd('Network.clearBrowserCache', {})
+                    started = time.perf_counter()
+                    driver.get(bot.normalize_url(url))
+                    loads.append(time.perf_counter() - started)
+                    transferred.append(driver.execute_script(TRANSFER_SCRIPT) or 0)
+        finally:
+            driver.quit()
+        report[label] = {'avg_load_s': round(sum(loads) / len(loads), 2),
+                         'avg_kb': round(sum(transferred) / len(transferred) / 1024, 1)}
+    report['saved_kb_pct'] = round(100 * (1 - report['on']['avg_kb'] / max(report['off']['avg_kb'], 0.001)), 1)
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Zara stok botu kontrol hattı benchmark'ı")
+    parser.add_argument('--pages', help="Kayıtlı ürün sayfalarının (.html) olduğu klasör; yoksa sentetik sayfa üretilir")
+    parser.add_argument('--count', type=int, default=20, help="Üretilecek sentetik sayfa sayısı")
+    parser.add_argument('--rounds', type=int, default=1)
+    parser.add_argument('--subscribers', type=int, default=3, help="Ürün başına takipçi sayısı")
+    parser.add_argument('--engine', choices=('http', 'selenium'), default=bot.FETCH_ENGINE)
+    parser.add_argument('--send-latency', type=float, default=0.05, help="Sahte Telegram gönderim gecikmesi (sn)")
+    parser.add_argument('--json', action='store_true', help="Raporu JSON olarak yaz")
+    parser.add_argument('--compare-blocking', action='store_true', help="Selenium'da kaynak engelleme açık/kapalı karşılaştır")
+    parser.add_argument('--startup', action='store_true', help="Açılış süresini ölç (import, durum yükleme, ilk mesaj, ilk kontrol)")
+    parser.add_argument('--url', action='append', default=[], help="Karşılaştırmada yerel sayfalar yerine kullanılacak gerçek ürün linki")
+    args = parser.parse_args()
+
+    bot.FETCH_ENGINE = args.engine
+    bot.timings.enabled = bot.timings.log_enabled = True
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = args.pages or tmp
+        if not args.pages: write_synthetic_pages(tmp, args.count)
+        server = serve(folder)
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        urls = [f"{base}/{name}" for name in sorted(os.listdir(folder)) if name.endswith('.html')]
+        try:
+            if args.compare_blocking:
+                print(json.dumps(compare_blocking(args.url or urls, args.rounds), indent=2))
+                return
+            if args.startup:
+                db_path = os.path.join(tmp, 'startup.db')
+                report = {'import': measure_import(os.path.join(tmp, 'probe.db'))}
+                report.update(asyncio.run(run_startup(args, urls, base, db_path)))
+                print(json.dumps(report, indent=2, ensure_ascii=False))
+                return
+            report = asyncio.run(run(args, urls))
+        finally: server.shutdown()
+
+    report['stages'] = {k: {'count': v['count'], 'avg': round(v['sum'] / v['count'], 4), 'max': round(v['max'], 4)}
+                        for k, v in bot.timings.snapshot().items() if v['count']}
+    report['peak_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    report['peak_rss_children_mb'] = round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1)
+
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+        return
+    for key, value in report.items():
+        if key != 'stages': print(f"{key}: {value}")
+    print("Aşama süreleri:\n" + bot.timings.summary())
+
+if __name__ == "__main__":
+    main()
@@ -1,43 +1,347 @@
 import os
+import sys
+import socket
 import logging
 import asyncio
 import time
 import re
+import queue
+import threading
+import json
+import copy
+import csv
+import io
+import hashlib
+import sqlite3
+import heapq
+import random
+from collections import OrderedDict, Counter, deque
+import bisect
+import signal
+import shutil
+import fcntl
+import multiprocessing
+from contextlib import contextmanager
+import html as html_lib
+from urllib.parse import urlparse, urlunparse, parse_qs, urlencode
 from datetime import datetime, timedelta
-from typing import Dict, List
+from typing import Dict, List, Optional
+
+BOOT_STARTED = time.perf_counter() # Açılış ölçümü: ağır importlar dahil
 
 # Telegram
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, BotCommand
 from telegram.ext import (
-    Application, CommandHandler, CallbackQueryHandler, MessageHandler, ContextTypes, filters
+    Application, CommandHandler, CallbackQueryHandler, MessageHandler, TypeHandler, ContextTypes, filters
 )
 from telegram.constants import ParseMode
+from telegram.error import RetryAfter, TelegramError
+
+# HTTP
+import httpx
 
-# Selenium
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException
+# Selenium: HTTP motoru çoğu kontrolü tek başına yaptığı için ilk tarayıcı açılırken yüklenir (load_selenium)
+webdriver = Options = Service = By = WebDriverWait = EC = TimeoutException = None
 
 # --- AYARLAR ---
 TELEGRAM_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 ALLOWED_USERS = os.getenv('ALLOWED_USERS', '').split(',')
 ADMIN_ID = "5952744818" # SENİN ID
-CHECK_INTERVAL = 180 
+CHECK_INTERVAL = int(os.getenv('CHECK_INTERVAL', '180')) # Ürün başına temel kontrol aralığı (sn)
+MIN_CHECK_INTERVAL = int(os.getenv('MIN_CHECK_INTERVAL', '60')) # Yeni eklenen / durumu değişen ürünler
+MAX_CHECK_INTERVAL = int(os.getenv('MAX_CHECK_INTERVAL', '3600')) # Uzun süredir aynı kalan / hata veren ürünler
+CHECKS_PER_MINUTE = float(os.getenv('CHECKS_PER_MINUTE', '20')) # Tüm ürünler için dakikalık kontrol bütçesi
+SCHEDULER_TICK = int(os.getenv('SCHEDULER_TICK', '15')) # Zamanı gelen ürünlere bakma sıklığı (sn)
+DRIVER_POOL_SIZE = int(os.getenv('DRIVER_POOL_SIZE', '3')) # Aynı anda açık kalacak Chrome sayısı (CHECK_WORKERS + INTERACTIVE_WORKERS)
+DRIVER_MAX_PAGES = int(os.getenv('DRIVER_MAX_PAGES', '50')) # Bu kadar sayfadan sonra Chrome yenilenir
+CHECK_WORKERS = int(os.getenv('CHECK_WORKERS', '2')) # Arka planda aynı anda kontrol edilen ürün sayısı
+INTERACTIVE_WORKERS = int(os.getenv('INTERACTIVE_WORKERS', '1')) # Kullanıcı istekleri için ayrılan ek kontrol yeri
+ANALYSIS_CACHE_TTL = int(os.getenv('ANALYSIS_CACHE_TTL', '300')) # İlk analiz sonucunun beden girişinde tekrar kullanılma süresi (sn)
+RESULT_CACHE_SIZE = int(os.getenv('RESULT_CACHE_SIZE', '1000')) # Bellekte tutulan ürün sonucu sayısı (LRU)
+RESULT_CACHE_TTL = int(os.getenv('RESULT_CACHE_TTL', '120')) # Bu süreden yeni sonuç 🔄'da direkt gösterilir (sn)
+RESULT_CACHE_MAX_AGE = int(os.getenv('RESULT_CACHE_MAX_AGE', '3600')) # Bundan eski sonuç hiç kullanılmaz (sn)
+ZARA_RATE = float(os.getenv('ZARA_RATE', '0.5')) # zara.com için saniyedeki istek
+ZARA_BURST = int(os.getenv('ZARA_BURST', '2'))
+FETCH_ENGINE = os.getenv('FETCH_ENGINE', 'http').lower() # 'http' (Selenium yedekli) veya 'selenium'
+TIMING_ENABLED = os.getenv('TIMING', '0') == '1' # Aşama sürelerini ölç ve periyodik olarak logla
+TIMING_LOG_INTERVAL = int(os.getenv('TIMING_LOG_INTERVAL', '300'))
+TG_GLOBAL_RATE = float(os.getenv('TG_GLOBAL_RATE', '25')) # Telegram'a saniyede en fazla mesaj (limit ~30)
+TG_CHAT_INTERVAL = float(os.getenv('TG_CHAT_INTERVAL', '1.0')) # Aynı sohbete iki mesaj arası en az süre (sn)
+NOTIFY_WORKERS = int(os.getenv('NOTIFY_WORKERS', '4'))
+SCRAPER_WORKERS = int(os.getenv('SCRAPER_WORKERS', '0')) # 0 = Selenium bot sürecindeki thread havuzunda çalışır
+SCRAPE_TIMEOUT = int(os.getenv('SCRAPE_TIMEOUT', '90')) # İşçi süreçte tek kontrol için sert süre sınırı (sn)
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0')) # 0 = kapalı; açıksa /metrics Prometheus formatında sunulur
+DB_PATH = os.getenv('DB_PATH', 'data/zara.db')
+REMOTE_WORKERS = os.getenv('REMOTE_WORKERS', '0') == '1' # Arka plan kontrollerini ortak DB üzerinden işçi konteynerlerine dağıt
+SHARD_LEASE_SECONDS = int(os.getenv('SHARD_LEASE_SECONDS', '60')) # İşçinin aldığı işi tutma süresi (heartbeat ile uzar)
+SHARD_JOB_TIMEOUT = int(os.getenv('SHARD_JOB_TIMEOUT', '300')) # Bu sürede sonuç gelmezse iş hatalı sayılır (sn)
+SHARD_BATCH = int(os.getenv('SHARD_BATCH', '3')) # İşçinin tek seferde aldığı iş sayısı
+SHARD_WRITE_RETRIES = 5 # Sonuç yazılamazsa (database is locked) artan beklemeyle tekrar deneme sayısı
+BLOCK_RESOURCES = os.getenv('BLOCK_RESOURCES', 'fonts,media,css,trackers') # Selenium'da engellenecek gruplar; 'off' = kapalı
+BLOCKED_URL_PATTERNS = os.getenv('BLOCKED_URL_PATTERNS', '') # Ek engellenecek URL desenleri (virgülle, * joker)
+CHROME_PROFILE_DIR = os.getenv('CHROME_PROFILE_DIR', 'data/chrome-profiles') # Boşsa her Chrome geçici profille açılır
+NODE_ID = os.getenv('NODE_ID') or socket.gethostname() # Profil alt klasörü; konteynerde sabit bir isim verin (hostname her yeniden oluşturmada değişir)
+PROFILE_RETENTION_DAYS = float(os.getenv('PROFILE_RETENTION_DAYS', '7')) # Bu kadar gündür kullanılmayan eski profil klasörleri silinir
+USER_MAX_PRODUCTS = int(os.getenv('USER_MAX_PRODUCTS', '100')) # Kullanıcı başına varsayılan ürün kotası (0 = sınırsız, admin panelinden kişiye özel ayarlanır)
+USER_REFRESH_PER_HOUR = int(os.getenv('USER_REFRESH_PER_HOUR', '30')) # Kullanıcı başına saatlik 🔄 taraması (0 = sınırsız)
+IMPORT_MAX_ITEMS = int(os.getenv('IMPORT_MAX_ITEMS', '50')) # /import ile tek seferde eklenebilecek en fazla ürün
+PREWARM_BROWSERS = int(os.getenv('PREWARM_BROWSERS', '1' if FETCH_ENGINE == 'selenium' else '0')) # Açılışta önceden açılacak Chrome sayısı
+FIRST_CHECK_DELAY = float(os.getenv('FIRST_CHECK_DELAY', '1')) # Açılıştan sonra ilk kontrol turuna kadar beklenen süre (sn)
+CHROME_BIN = os.getenv('CHROME_BIN', '') # Boşsa Selenium sistemdeki Chrome'u kendisi bulur (Docker'da /usr/bin/chromium)
+CHROMEDRIVER_PATH = os.getenv('CHROMEDRIVER_PATH', '')
+WARM_URL = "https://www.zara.com/tr/tr/"
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
 
 logging.basicConfig(format='%(asctime)s - %(levelname)s - %(message)s', level=logging.INFO)
 logger = logging.getLogger(__name__)
+logging.getLogger("httpx").setLevel(logging.WARNING)
 
 # --- VERİTABANI ---
 tracked_products: Dict[str, Dict] = {}
 pending_adds: Dict[int, str] = {} 
 waiting_for_sizes: Dict[int, Dict] = {} # {user_id: {'url': '...', 'category': '...'}}
+snapshots: Dict[str, Dict] = {} # {product_key: {'hash': ..., 'data': {...}}} son görülen ürün durumu
 
 # ADMIN İÇİN
 known_users: Dict[str, Dict] = {} 
 admin_reply_mode: Dict[str, str] = {} 
+waiting_for_import: Dict[int, bool] = {} # /import sonrası dosya bekleyenler
+
+# --- KALICI DEPO (SQLite) ---
+# Bellekteki sözlükler çalışma kopyasıdır; her değişiklik buraya da yazılır ki restart'ta kaybolmasın.
+# Diyalog durumları (pending_adds, waiting_for_sizes) kısa ömürlü olduğu için saklanmaz.
+class Store:
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            folder = os.path.dirname(self.path)
+            if folder: os.makedirs(folder, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000") # İşçi konteynerleri de aynı dosyaya yazar
+            conn.executescript('''
+                CREATE TABLE IF NOT EXISTS products (
+                    key TEXT PRIMARY KEY, user_id TEXT NOT NULL, url TEXT NOT NULL,
+                    product_key TEXT NOT NULL, data TEXT NOT NULL);
+                CREATE INDEX IF NOT EXISTS idx_products_user ON products(user_id);
+                CREATE INDEX IF NOT EXISTS idx_products_pkey ON products(product_key);
+                CREATE TABLE IF NOT EXISTS users (user_id TEXT PRIMARY KEY, data TEXT NOT NULL);
+                CREATE TABLE IF NOT EXISTS check_history (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT, product_key TEXT NOT NULL,
+                    checked_at TEXT NOT NULL, status TEXT NOT NULL, availability TEXT, sizes TEXT);
+                CREATE INDEX IF NOT EXISTS idx_history_pkey ON check_history(product_key, checked_at);
+                CREATE TABLE IF NOT EXISTS snapshots (
+                    product_key TEXT PRIMARY KEY, hash TEXT NOT NULL, data TEXT NOT NULL, updated_at TEXT NOT NULL);
+                CREATE TABLE IF NOT EXISTS shard_jobs (
+                    product_key TEXT PRIMARY KEY, url TEXT NOT NULL, priority INTEGER NOT NULL, enqueued_at REAL NOT NULL,
+                    lease_owner TEXT, lease_expires REAL, attempts INTEGER NOT NULL DEFAULT 0, result TEXT, finished_at REAL);
+                CREATE INDEX IF NOT EXISTS idx_shard_jobs_claim ON shard_jobs(result, priority, enqueued_at);
+                CREATE TABLE IF NOT EXISTS shard_workers (worker_id TEXT PRIMARY KEY, heartbeat REAL NOT NULL, done INTEGER NOT NULL DEFAULT 0);
+            ''')
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def _dump(product: Dict) -> str:
+        return json.dumps(product, default=lambda o: o.isoformat() if isinstance(o, datetime) else str(o), ensure_ascii=False)
+
+    @staticmethod
+    def _load(raw: str) -> Dict:
+        product = json.loads(raw)
+        if product.get('last_check'):
+            try: product['last_check'] = datetime.fromisoformat(product['last_check'])
+            except ValueError: product['last_check'] = datetime.now()
+        return product
+
+    def _product_row(self, key: str, product: Dict):
+        return (key, product['user_id'], product['url'], product_key(product['url']), self._dump(product))
+
+    def save_products(self, items: Dict[str, Dict]):
+        if not items: return
+        with self._lock, self.conn:
+            # OR REPLACE satırı silip yeniden eklerdi; rowid değişince ürün /list sonunda görünürdü
+            self.conn.executemany("INSERT INTO products (key, user_id, url, product_key, data) VALUES (?, ?, ?, ?, ?) "
+                                  "ON CONFLICT(key) DO UPDATE SET user_id = excluded.user_id, url = excluded.url, "
+                                  "product_key = excluded.product_key, data = excluded.data",
+                                  [self._product_row(k, v) for k, v in items.items()])
+
+    def save_product(self, key: str, product: Dict):
+        self.save_products({key: product})
+
+    def delete_product(self, key: str):
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM products WHERE key = ?", (key,))
+
+    def load_products(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {k: self._load(d) for k, d in self.conn.execute("SELECT key, data FROM products")}
+
+    def user_product_keys(self, user_id: str) -> List[str]:
+        with self._lock:
+            return [r[0] for r in self.conn.execute("SELECT key FROM products WHERE user_id = ? ORDER BY rowid", (user_id,))]
+
+    def count_user_products(self, user_id: str) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM products WHERE user_id = ?", (user_id,)).fetchone()[0]
+
+    def save_user(self, user_id: str, data: Dict):
+        with self._lock, self.conn:
+            self.conn.execute("INSERT INTO users (user_id, data) VALUES (?, ?) ON CONFLICT(user_id) DO UPDATE SET data = excluded.data", (user_id, self._dump(data)))
+
+    def load_users(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {u: json.loads(d) for u, d in self.conn.execute("SELECT user_id, data FROM users")}
+
+    def add_history(self, rows: List[tuple]):
+        if not rows: return
+        with self._lock, self.conn:
+            self.conn.executemany("INSERT INTO check_history (product_key, checked_at, status, availability, sizes) VALUES (?, ?, ?, ?, ?)", rows)
+
+    def save_snapshots(self, items: Dict[str, Dict]):
+        if not items: return
+        now = datetime.now().isoformat()
+        with self._lock, self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO snapshots (product_key, hash, data, updated_at) VALUES (?, ?, ?, ?)",
+                                  [(k, v['hash'], json.dumps(v['data'], ensure_ascii=False), now) for k, v in items.items()])
+
+    def load_snapshots(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {k: {'hash': h, 'data': json.loads(d)} for k, h, d in self.conn.execute("SELECT product_key, hash, data FROM snapshots")}
+
+    # --- Parçalı (shard) kontrol işleri ---
+    def enqueue_jobs(self, jobs: List[tuple]):
+        # jobs: [(product_key, url, priority)]; zaten bekleyen iş tekrar eklenmez
+        now = time.time()
+        with self._lock, self.conn:
+            self.conn.executemany("INSERT OR IGNORE INTO shard_jobs (product_key, url, priority, enqueued_at) VALUES (?, ?, ?, ?)",
+                                  [(k, u, p, now) for k, u, p in jobs])
+
+    def claim_jobs(self, worker_id: str, limit: int, lease: float) -> List[tuple]:
+        now = time.time()
+        with self._lock, self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            rows = self.conn.execute(
+                "SELECT product_key, url FROM shard_jobs WHERE result IS NULL AND (lease_expires IS NULL OR lease_expires < ?) "
+                "ORDER BY priority, enqueued_at LIMIT ?", (now, limit)).fetchall()
+            self.conn.executemany("UPDATE shard_jobs SET lease_owner = ?, lease_expires = ?, attempts = attempts + 1 WHERE product_key = ?",
+                                  [(worker_id, now + lease, k) for k, _ in rows])
+        return rows
+
+    def renew_leases(self, worker_id: str, keys: List[str], lease: float):
+        if not keys: return
+        with self._lock, self.conn:
+            self.conn.executemany("UPDATE shard_jobs SET lease_expires = ? WHERE product_key = ? AND lease_owner = ?",
+                                  [(time.time() + lease, k, worker_id) for k in keys])
+
+    def finish_job(self, worker_id: str, pkey: str, result: Dict):
+        with self._lock, self.conn:
+            self.conn.execute("UPDATE shard_jobs SET result = ?, finished_at = ? WHERE product_key = ? AND lease_owner = ?",
+                              (json.dumps(result, ensure_ascii=False), time.time(), pkey, worker_id))
+            self.conn.execute("UPDATE shard_workers SET done = done + 1 WHERE worker_id = ?", (worker_id,))
+
+    def collect_results(self) -> List[tuple]:
+        with self._lock, self.conn:
+            rows = self.conn.execute("SELECT product_key, result FROM shard_jobs WHERE result IS NOT NULL").fetchall()
+            self.conn.executemany("DELETE FROM shard_jobs WHERE product_key = ?", [(k,) for k, _ in rows])
+        return [(k, json.loads(r)) for k, r in rows]
+
+    def drop_jobs(self, keys: List[str]):
+        with self._lock, self.conn:
+            self.conn.executemany("DELETE FROM shard_jobs WHERE product_key = ?", [(k,) for k in keys])
+
+    def heartbeat(self, worker_id: str):
+        with self._lock, self.conn:
+            self.conn.execute("INSERT INTO shard_workers (worker_id, heartbeat) VALUES (?, ?) "
+                              "ON CONFLICT(worker_id) DO UPDATE SET heartbeat = excluded.heartbeat", (worker_id, time.time()))
+
+    def live_workers(self, max_age: float) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM shard_workers WHERE heartbeat > ?", (time.time() - max_age,)).fetchone()[0]
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+store = Store(DB_PATH)
+
+def load_state():
+    tracked_products.update(store.load_products())
+    known_users.update(store.load_users())
+    snapshots.update(store.load_snapshots())
+    logger.info(f"Depodan yüklendi: {len(tracked_products)} ürün, {len(known_users)} kullanıcı")
+
+# --- ZAMAN ÖLÇÜMÜ ---
+# Kontrol hattının aşamaları (tarayıcı alma, sayfa yükleme, popup, beden okuma, bildirim...)
+# için gecikme histogramları. Kapalıyken stage() hiçbir şey yapmaz.
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 3, 5, 10, 20, 30, 60)
+
+class StageTimings:
+    def __init__(self, enabled: bool, log_interval: int):
+        self.enabled = enabled
+        self.log_enabled = enabled # Metrikler ölçümü açsa da periyodik log sadece TIMING=1 ile
+        self.log_interval = log_interval
+        self.stages: Dict[str, Dict] = {}
+        self.last_log = time.monotonic()
+        self.capture: Optional[List[tuple]] = None # İşçi süreçte ölçümler ana sürece taşınmak üzere biriktirilir
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float):
+        if not self.enabled: return
+        if self.capture is not None:
+            self.capture.append((stage, seconds))
+            return
+        with self._lock:
+            hist = self.stages.setdefault(stage, {'buckets': [0] * (len(LATENCY_BUCKETS) + 1), 'count': 0, 'sum': 0.0, 'max': 0.0})
+            hist['buckets'][bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            hist['count'] += 1
+            hist['sum'] += seconds
+            hist['max'] = max(hist['max'], seconds)
+
+    @contextmanager
+    def stage(self, name: str):
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try: yield
+        finally: self.observe(name, time.perf_counter() - started)
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {k: {**v, 'buckets': list(v['buckets'])} for k, v in self.stages.items()}
+
+    @staticmethod
+    def percentile(hist: Dict, q: float) -> float:
+        # Kova üst sınırı üzerinden yaklaşık değer
+        target = hist['count'] * q
+        seen = 0
+        for i, n in enumerate(hist['buckets']):
+            seen += n
+            if seen >= target and n: return LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else hist['max']
+        return hist['max']
+
+    def summary(self) -> str:
+        lines = []
+        for name, hist in sorted(self.snapshot().items()):
+            if not hist['count']: continue
+            lines.append(f"{name}: n={hist['count']} ort={hist['sum'] / hist['count']:.2f}sn "
+                         f"p50<={self.percentile(hist, 0.5):.2f}sn p95<={self.percentile(hist, 0.95):.2f}sn max={hist['max']:.2f}sn")
+        return "\n".join(lines)
+
+    def maybe_log(self):
+        if not self.log_enabled or time.monotonic() - self.last_log < self.log_interval: return
+        self.last_log = time.monotonic()
+        summary = self.summary()
+        if summary: logger.info("Aşama süreleri:\n" + summary)
+
+timings = StageTimings(TIMING_ENABLED, TIMING_LOG_INTERVAL)
 
 # --- YETKİ KONTROLÜ ---
 async def is_authorized(update: Update):
@@ -51,6 +355,7 @@ async def is_authorized(update: Update):
             'joined': datetime.now().strftime("%Y-%m-%d"),
             'last_msg': '-'
         }
+        store.save_user(user_id, known_users[user_id])
     
     if user_id == ADMIN_ID: return True
 
@@ -62,7 +367,23 @@ async def is_authorized(update: Update):
     return True
 
 # --- TARAYICI MOTORU ---
-def get_driver():
+def load_selenium():
+    global webdriver, Options, Service, By, WebDriverWait, EC, TimeoutException
+    if webdriver is not None: return
+    started = time.perf_counter()
+    from selenium import webdriver as _webdriver
+    from selenium.webdriver.chrome.options import Options as _Options
+    from selenium.webdriver.chrome.service import Service as _Service
+    from selenium.webdriver.common.by import By as _By
+    from selenium.webdriver.support.ui import WebDriverWait as _WebDriverWait
+    from selenium.webdriver.support import expected_conditions as _EC
+    from selenium.common.exceptions import TimeoutException as _TimeoutException
+    Options, Service, By, WebDriverWait, EC, TimeoutException = _Options, _Service, _By, _WebDriverWait, _EC, _TimeoutException
+    webdriver = _webdriver
+    logger.info(f"Selenium yüklendi ({time.perf_counter() - started:.2f}s)")
+
+def get_driver(profile_dir: Optional[str] = None):
+    load_selenium()
     chrome_options = Options()
     chrome_options.page_load_strategy = 'eager' 
     chrome_options.add_argument("--headless=new") 
@@ -71,11 +392,220 @@ def get_driver():
     chrome_options.add_argument("--disable-gpu")
     chrome_options.add_argument("--window-size=1920,1080")
     chrome_options.add_argument("--disable-blink-features=AutomationControlled")
-    chrome_options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
+    chrome_options.add_argument(f"user-agent={USER_AGENT}")
+    
+    if profile_dir:
+        os.makedirs(profile_dir, exist_ok=True)
+        chrome_options.add_argument(f"--user-data-dir={os.path.abspath(profile_dir)}")
     
+    if CHROME_BIN: chrome_options.binary_location = CHROME_BIN
     prefs = {"profile.managed_default_content_settings.images": 2}
     chrome_options.add_experimental_option("prefs", prefs)
-    return webdriver.Chrome(options=chrome_options)
+    service = Service(executable_path=CHROMEDRIVER_PATH) if CHROMEDRIVER_PATH else None
+    driver = webdriver.Chrome(options=chrome_options, service=service)
+    apply_resource_blocking(driver)
+    return driver
+
+# --- KAYNAK ENGELLEME ---
+# h1, fiyat, og:image ve beden seçicisi için gerekmeyen istekler CDP ile daha tarayıcıda kesilir.
+# Akamai bot koruması gibi sayfanın açılması için şart olan scriptlere dokunulmaz.
+RESOURCE_BLOCKLIST = {
+    'fonts': ["*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot"],
+    'media': ["*.mp4", "*.webm", "*.m3u8", "*.jpg", "*.jpeg", "*.png", "*.gif", "*.webp", "*.avif", "*.svg", "*.ico"],
+    'css': ["*.css", "*.css?*"],
+    'trackers': ["*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*", "*googleadservices.com*",
+                 "*connect.facebook.net*", "*facebook.com/tr*", "*analytics.tiktok.com*", "*ct.pinterest.com*",
+                 "*bat.bing.com*", "*criteo.*", "*hotjar.com*", "*quantummetric.com*", "*dynatrace*",
+                 "*go-mpulse.net*", "*akstat.io*", "*cdn.cookielaw.org*", "*onetrust*", "*optimizely*"],
+}
+
+def blocked_url_patterns() -> List[str]:
+    if BLOCK_RESOURCES.lower() in ('', 'off', '0', 'false'): return []
+    groups = [g.strip() for g in BLOCK_RESOURCES.split(',') if g.strip()]
+    patterns = [p for g in groups for p in RESOURCE_BLOCKLIST.get(g, [])]
+    return patterns + [p.strip() for p in BLOCKED_URL_PATTERNS.split(',') if p.strip()]
+
+def apply_resource_blocking(driver, patterns: Optional[List[str]] = None):
+    patterns = blocked_url_patterns() if patterns is None else patterns
+    if not patterns: return
+    try:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': patterns})
+    except Exception as e:
+        logger.warning(f"Kaynak engelleme açılamadı: {e}")
+
+# --- OTURUM / POPUP ---
+# Her tarayıcı yuvasının kalıcı bir profili var; mağaza ve çerez seçimi bir kez yapılınca profilde
+# kalır. Hazır oturumda popup'lar beklemeden, sadece o an sayfada varsa tıklanır.
+SESSION_MARKER = "zara_session_ready"
+POPUP_SELECTOR = "button[data-qa-action='stay-in-store'], #onetrust-accept-btn-handler"
+
+def dismiss_popups(driver):
+    if getattr(driver, '_zara_session_ready', False):
+        for button in driver.find_elements(By.CSS_SELECTOR, POPUP_SELECTOR):
+            try: driver.execute_script("arguments[0].click();", button)
+            except: pass
+        return
+
+    try:
+        geo_btn = WebDriverWait(driver, 3).until(EC.presence_of_element_located((By.CSS_SELECTOR, "button[data-qa-action='stay-in-store']")))
+        driver.execute_script("arguments[0].click();", geo_btn)
+    except: pass
+    try:
+        cookie = driver.find_element(By.ID, "onetrust-accept-btn-handler")
+        driver.execute_script("arguments[0].click();", cookie)
+    except: pass
+    driver._zara_session_ready = True
+    profile = getattr(driver, '_zara_profile', None)
+    if profile:
+        try: open(os.path.join(profile, SESSION_MARKER), "w").close()
+        except OSError: pass
+
+# --- PROFİL SAHİPLİĞİ ---
+# Profiller CHROME_PROFILE_DIR/NODE_ID/<havuz>-<yuva> altında durur. Aynı NODE_ID'yi paylaşan süreçler
+# (ör. aynı klasörü bağlayan --worker kopyaları) yuvayı profilin yanındaki .claim dosyasına flock alarak
+# sahiplenir; meşgulse <yuva>-1, -2... denenir. Kilit süreç ölünce çekirdek tarafından bırakılır.
+# Chrome'un kendi Singleton kilitleri, .claim bizdeyken sadece sahibi bu makinede yaşıyorsa korunur:
+# başka hostname'e ait kilit, yeniden oluşturulmuş bir konteynerden kalmıştır.
+PROFILE_CANDIDATES = 8
+
+def chrome_lock_alive(profile_dir: str) -> bool:
+    try: target = os.readlink(os.path.join(profile_dir, "SingletonLock")) # "<hostname>-<pid>"
+    except OSError: return False
+    host, _, pid = target.rpartition('-')
+    if host != socket.gethostname(): return False
+    try: os.kill(int(pid), 0)
+    except ProcessLookupError: return False
+    except (ValueError, PermissionError): return True
+    return True
+
+def claim_profile(base: str):
+    for n in range(PROFILE_CANDIDATES):
+        path = base if n == 0 else f"{base}-{n}"
+        os.makedirs(path, exist_ok=True)
+        handle = open(path + ".claim", "w")
+        try: fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError: handle.close(); continue
+        if chrome_lock_alive(path): handle.close(); continue
+        for lock in ("SingletonLock", "SingletonCookie", "SingletonSocket"):
+            try: os.remove(os.path.join(path, lock))
+            except OSError: pass
+        return path, handle
+    logger.warning(f"Boşta Chrome profili yok ({base}), geçici profil kullanılıyor")
+    return None, None
+
+def _claims_idle(folder: str, held: List) -> Optional[float]:
+    # Klasördeki tüm .claim'leri kilitler (silinene kadar held'de tutulur) ve en son kullanım
+    # zamanını döndürür; biri başka süreçte tutuluyorsa None
+    newest = os.path.getmtime(folder)
+    for name in os.listdir(folder):
+        if not name.endswith(".claim"): continue
+        path = os.path.join(folder, name)
+        handle = open(path, "a")
+        held.append(handle)
+        try: fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError: return None
+        newest = max(newest, os.path.getmtime(path))
+    return newest
+
+# Eski hostname'lerle açılmış düğüm klasörleri ve NODE_ID öncesi düz profiller birikmesin
+def prune_profile_dirs():
+    if not CHROME_PROFILE_DIR or PROFILE_RETENTION_DAYS <= 0 or not os.path.isdir(CHROME_PROFILE_DIR): return
+    cutoff = time.time() - PROFILE_RETENTION_DAYS * 86400
+    for name in os.listdir(CHROME_PROFILE_DIR):
+        folder = os.path.join(CHROME_PROFILE_DIR, name)
+        if name == NODE_ID or not os.path.isdir(folder): continue
+        held: List = []
+        try:
+            last_used = _claims_idle(folder, held)
+            if last_used is None or last_used > cutoff: continue
+            shutil.rmtree(folder)
+            logger.info(f"Kullanılmayan profil klasörü silindi: {folder}")
+        except OSError as e:
+            logger.warning(f"Profil klasörü temizlenemedi ({folder}): {e}")
+        finally:
+            for handle in held: handle.close()
+
+# --- TARAYICI HAVUZU ---
+# Her kontrol için Chrome açıp kapatmak yerine sıcak tarayıcıları ödünç verip geri alıyoruz.
+class DriverPool:
+    def __init__(self, size: int, max_pages: int, name: str = "main"):
+        self.size = max(1, size)
+        self.max_pages = max(1, max_pages)
+        self.name = name
+        self._free_slots = list(range(self.size)) # Her yuvanın kendi Chrome profili olur
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        self._live = 0
+
+    @property
+    def live(self) -> int:
+        return self._live
+
+    def _is_healthy(self, driver) -> bool:
+        try:
+            if driver.service.process and driver.service.process.poll() is not None: return False
+            driver.current_url
+            return True
+        except Exception:
+            return False
+
+    def _new_driver(self):
+        with self._lock: slot = self._free_slots.pop()
+        claim = None
+        try:
+            profile, claim = claim_profile(os.path.join(CHROME_PROFILE_DIR, NODE_ID, f"{self.name}-{slot}")) if CHROME_PROFILE_DIR else (None, None)
+            driver = get_driver(profile)
+        except Exception:
+            if claim: claim.close()
+            with self._lock: self._free_slots.append(slot)
+            raise
+        driver._zara_claim = claim
+        driver._zara_pages = 0
+        driver._zara_slot = slot
+        driver._zara_profile = profile
+        driver._zara_session_ready = bool(profile) and os.path.exists(os.path.join(profile, SESSION_MARKER))
+        with self._lock: self._live += 1
+        return driver
+
+    def _discard(self, driver):
+        try: driver.quit()
+        except Exception: pass
+        if driver._zara_claim: driver._zara_claim.close()
+        with self._lock:
+            self._live -= 1
+            self._free_slots.append(driver._zara_slot)
+
+    def acquire(self, timeout: float = None):
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError("Boşta tarayıcı yok")
+        try:
+            while True:
+                try: driver = self._idle.get_nowait()
+                except queue.Empty: return self._new_driver()
+                if self._is_healthy(driver): return driver
+                self._discard(driver)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, driver, broken: bool = False):
+        try:
+            driver._zara_pages += 1
+            if broken or driver._zara_pages >= self.max_pages or not self._is_healthy(driver):
+                self._discard(driver)
+            else:
+                self._idle.put(driver)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        while True:
+            try: self._discard(self._idle.get_nowait())
+            except queue.Empty: break
+
+driver_pool = DriverPool(DRIVER_POOL_SIZE, DRIVER_MAX_PAGES)
 
 def clean_size_text(text):
     if not text: return ""
@@ -83,11 +613,8 @@ def clean_size_text(text):
     text = re.sub(r"\(.*?\)", "", text) 
     return text.strip()
 
-async def check_stock_selenium(url: str):
-    if "zara.com" in url and "/tr/tr" not in url:
-        url = url.replace("zara.com/", "zara.com/tr/tr/")
-
-    result = {
+def empty_result() -> Dict:
+    return {
         'status': 'error', 
         'name': 'Zara Ürünü', 
         'availability': 'out_of_stock', 
@@ -96,24 +623,71 @@ async def check_stock_selenium(url: str):
         'price': 'Fiyat Yok',
         'category': 'clothing'
     }
-    
-    loop = asyncio.get_running_loop()
-    
-    def sync_process():
-        driver = get_driver()
-        try:
-            driver.get(url)
-            wait = WebDriverWait(driver, 15)
-            
-            try:
-                geo_btn = WebDriverWait(driver, 3).until(EC.presence_of_element_located((By.CSS_SELECTOR, "button[data-qa-action='stay-in-store']")))
-                driver.execute_script("arguments[0].click();", geo_btn)
-            except: pass
-            try:
-                cookie = driver.find_element(By.ID, "onetrust-accept-btn-handler")
-                driver.execute_script("arguments[0].click();", cookie)
-            except: pass
 
+# --- KATEGORİ BELİRLEME ---
+def detect_category(name: str) -> str:
+    u_name = name.upper()
+    acc_keywords = ["ÇANTA", "BAG", "PARFÜM", "PERFUME", "KOLYE", "KÜPE", "ŞAL", "KEMER", "CÜZDAN", "WALLET"]
+    shoe_keywords = ["AYAKKABI", "BOT", "ÇİZME", "MAKOSEN", "TOPUKLU", "SANDALET", "TERLİK", "SNEAKER", "BAMBA", "SHOES", "BOOTS"]
+    jean_keywords = ["JEAN", "DENIM", "PANTOLON", "TROUSERS"]
+
+    if any(k in u_name for k in acc_keywords): return 'accessory'
+    if any(k in u_name for k in shoe_keywords): return 'shoes'
+    if any(k in u_name for k in jean_keywords): return 'jeans'
+    return 'clothing'
+
+# --- URL NORMALİZASYONU ---
+# Aynı ürünü takip eden herkes tek bir anahtara düşsün diye linkleri sadeleştiriyoruz.
+# v1 renk seçimini belirttiği için korunur, diğer (takip/kampanya) parametreleri atılır.
+KEEP_QUERY_PARAMS = ('v1',)
+
+def is_zara_link(url: str) -> bool:
+    host = (urlparse(url if "://" in url else "https://" + url).hostname or '').lower()
+    return host == "zara.com" or host.endswith(".zara.com")
+
+def normalize_url(url: str) -> str:
+    url = url.strip()
+    if not is_zara_link(url): return url
+    parsed = urlparse(url if "://" in url else "https://" + url)
+    path = parsed.path
+    if not path.startswith("/tr/tr"):
+        path = re.sub(r"^/[a-z]{2}/[a-z]{2}(?=/|$)", "", path)
+        path = "/tr/tr" + (path if path.startswith("/") else "/" + path)
+    params = parse_qs(parsed.query)
+    query = urlencode([(k, params[k][0]) for k in KEEP_QUERY_PARAMS if k in params])
+    return urlunparse(('https', 'www.zara.com', path, '', query, ''))
+
+def product_key(url: str) -> str:
+    normalized = normalize_url(url)
+    match = re.search(r"-p(\d+)\.html", normalized)
+    if not match: return normalized
+    color = parse_qs(urlparse(normalized).query).get('v1', [''])[0]
+    return f"{match.group(1)}:{color}" if color else match.group(1)
+
+# Tüm beden tablosunu tek WebDriver çağrısında okur: [{label, text, disabled}]
+SIZE_TABLE_SCRIPT = """
+return Array.from(document.querySelectorAll("[data-qa-qualifier='size-selector-sizes-size-label']")).map(function (el) {
+    var parent = el.closest('li') || el.closest('button');
+    var classes = parent ? String(parent.className) : '';
+    return {
+        label: (el.innerText || '').trim(),
+        text: parent ? parent.innerText : '',
+        disabled: !!parent && (classes.includes('is-disabled') || classes.includes('out-of-stock') || parent.hasAttribute('disabled'))
+    };
+});
+"""
+
+def scrape_with_selenium(url: str) -> Dict:
+    result = empty_result()
+    with timings.stage('driver_acquire'): driver = driver_pool.acquire()
+    broken = False
+    try:
+        with timings.stage('page_load'): driver.get(url)
+        wait = WebDriverWait(driver, 15)
+
+        with timings.stage('popups'): dismiss_popups(driver)
+
+        with timings.stage('extract'):
             try: result['name'] = driver.find_element(By.TAG_NAME, "h1").text
             except: pass
             try: result['price'] = driver.find_element(By.CSS_SELECTOR, ".price-current__amount, .money-amount").text
@@ -124,21 +698,9 @@ async def check_stock_selenium(url: str):
                 result['image'] = img
             except: pass
 
-            # --- KATEGORİ BELİRLEME ---
-            u_name = result['name'].upper()
-            acc_keywords = ["ÇANTA", "BAG", "PARFÜM", "PERFUME", "KOLYE", "KÜPE", "ŞAL", "KEMER", "CÜZDAN", "WALLET"]
-            shoe_keywords = ["AYAKKABI", "BOT", "ÇİZME", "MAKOSEN", "TOPUKLU", "SANDALET", "TERLİK", "SNEAKER", "BAMBA", "SHOES", "BOOTS"]
-            jean_keywords = ["JEAN", "DENIM", "PANTOLON", "TROUSERS"]
-
-            if any(k in u_name for k in acc_keywords):
-                result['category'] = 'accessory'
-            elif any(k in u_name for k in shoe_keywords):
-                result['category'] = 'shoes'
-            elif any(k in u_name for k in jean_keywords):
-                result['category'] = 'jeans'
-            else:
-                result['category'] = 'clothing'
+        result['category'] = detect_category(result['name'])
 
+        with timings.stage('sizes'):
             # --- AKSESUAR KONTROLÜ (Direkt Ekle Butonu) ---
             if result['category'] == 'accessory':
                 try:
@@ -160,29 +722,26 @@ async def check_stock_selenium(url: str):
                 add_btn = wait.until(EC.element_to_be_clickable((By.XPATH, "//button[@data-qa-action='add-to-cart']")))
                 driver.execute_script("arguments[0].scrollIntoView(true);", add_btn)
                 driver.execute_script("arguments[0].click();", add_btn)
-                
-                wait.until(EC.visibility_of_element_located((By.XPATH, "//div[@data-qa-qualifier='size-selector-sizes-size-label']")))
-                time.sleep(1.5) 
-                
-                labels = driver.find_elements(By.CSS_SELECTOR, "[data-qa-qualifier='size-selector-sizes-size-label']")
+
+                # Sabit bekleme yerine beden listesi dolup iki okumada aynı kalana kadar bekle
+                last_read = {}
+                def sizes_ready(d):
+                    rows = d.execute_script(SIZE_TABLE_SCRIPT) or []
+                    stable = any(r['label'] for r in rows) and rows == last_read.get('rows')
+                    last_read['rows'] = rows
+                    return rows if stable else False
+                rows = WebDriverWait(driver, 15, poll_frequency=0.25).until(sizes_ready)
+
                 available_sizes = []
-                
-                for label in labels:
-                    try:
-                        raw_text = label.text.strip()
-                        if not raw_text: continue
-                        
-                        full_text_script = "var el = arguments[0]; var parent = el.closest('li') || el.closest('button'); return parent ? parent.innerText : '';"
-                        full_text = driver.execute_script(full_text_script, label).upper()
-                        forbidden = ["BENZER", "SIMILAR", "YAKINDA", "SOON", "TÜKENDİ", "OUT OF STOCK", "GELİNCE"]
-                        if any(f in full_text for f in forbidden): continue
-                        
-                        is_disabled = driver.execute_script("var el = arguments[0]; var parent = el.closest('li') || el.closest('button'); if (!parent) return false; var classes = parent.className; return classes.includes('is-disabled') || classes.includes('out-of-stock') || parent.hasAttribute('disabled');", label)
-                        if not is_disabled:
-                            clean_name = clean_size_text(raw_text)
-                            available_sizes.append(clean_name)
-                    except: continue
-                
+                forbidden = ["BENZER", "SIMILAR", "YAKINDA", "SOON", "TÜKENDİ", "OUT OF STOCK", "GELİNCE"]
+                for row in rows:
+                    raw_text = (row.get('label') or '').strip()
+                    if not raw_text: continue
+                    full_text = (row.get('text') or '').upper()
+                    if any(f in full_text for f in forbidden): continue
+                    if not row.get('disabled'):
+                        available_sizes.append(clean_size_text(raw_text))
+
                 result['sizes'] = available_sizes
                 result['availability'] = 'in_stock' if available_sizes else 'out_of_stock'
                 result['status'] = 'success'
@@ -190,14 +749,344 @@ async def check_stock_selenium(url: str):
             except TimeoutException:
                 result['status'] = 'success'
                 result['availability'] = 'out_of_stock'
-        
-        except Exception as e:
-            logger.error(f"Hata: {e}")
-            result['status'] = 'error'
+
+    except Exception as e:
+        logger.error(f"Hata: {e}")
+        result['status'] = 'error'
+        result['error'] = 'timeout' if isinstance(e, TimeoutException) else 'error'
+        broken = True
+    finally:
+        driver_pool.release(driver, broken)
+    return result
+
+async def check_stock_selenium(url: str):
+    url = normalize_url(url)
+    if scraper_pool: return await scraper_pool.submit(url)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, scrape_with_selenium, url)
+
+# --- AYRI SÜREÇLİ TARAYICI İŞÇİLERİ ---
+# SCRAPER_WORKERS > 0 ise Selenium işleri Telegram döngüsünden ayrı süreçlerde çalışır. Her işçi kendi
+# süreç grubunda tek Chrome tutar; SCRAPE_TIMEOUT aşılırsa grup komple öldürülüp işçi yenilenir.
+def scraper_worker_main(conn, timing_enabled: bool, index: int):
+    global driver_pool
+    os.setsid()
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    driver_pool = DriverPool(1, DRIVER_MAX_PAGES, f"worker-{index}")
+    timings.enabled = timing_enabled
+    timings.capture = []
+    if PREWARM_BROWSERS > index:
+        try: driver_pool.release(driver_pool.acquire())
+        except Exception as e: logger.warning(f"Tarayıcı önceden açılamadı: {e}")
+    try:
+        while True:
+            try: url = conn.recv()
+            except EOFError: break
+            if url is None: break
+            try: result = scrape_with_selenium(url)
+            except Exception as e:
+                logger.error(f"Tarayıcı açılamadı: {e}")
+                result = empty_result()
+            conn.send({'result': result, 'timings': timings.capture, 'chrome': driver_pool.live})
+            timings.capture = []
+    finally:
+        driver_pool.close()
+
+class ScraperProcess:
+    def __init__(self, ctx, index: int):
+        self.index = index
+        self.chrome = 0
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=scraper_worker_main, args=(child_conn, timings.enabled, index), name=f"scraper-{index}", daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    async def run(self, url: str, timeout: float) -> Dict:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def on_readable():
+            if future.done(): return
+            try: future.set_result(self.conn.recv())
+            except (EOFError, OSError) as e: future.set_exception(e)
+
+        fd = self.conn.fileno()
+        loop.add_reader(fd, on_readable)
+        try:
+            self.conn.send(url)
+            message = await asyncio.wait_for(future, timeout)
+        finally:
+            loop.remove_reader(fd)
+        self.chrome = message.get('chrome', 0)
+        for stage, seconds in message.get('timings', []): timings.observe(stage, seconds)
+        return message['result']
+
+    def kill(self):
+        try: os.killpg(self.process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError): pass
+        self.process.join(5)
+        self.conn.close()
+
+    def stop(self):
+        try: self.conn.send(None)
+        except (OSError, BrokenPipeError): pass
+        self.process.join(10)
+        if self.process.is_alive(): self.kill()
+        else: self.conn.close()
+
+class ScraperPool:
+    def __init__(self, size: int, timeout: float):
+        self.size = size
+        self.timeout = timeout
+        self._ctx = multiprocessing.get_context('spawn')
+        self.workers: List[ScraperProcess] = []
+        self._idle: Optional[asyncio.Queue] = None
+
+    def start(self):
+        self._idle = asyncio.Queue()
+        for i in range(self.size):
+            worker = ScraperProcess(self._ctx, i)
+            self.workers.append(worker)
+            self._idle.put_nowait(worker)
+        logger.info(f"{self.size} tarayıcı işçisi başlatıldı")
+
+    @property
+    def chrome_live(self) -> int:
+        return sum(w.chrome for w in self.workers)
+
+    def _replace(self, worker: ScraperProcess) -> ScraperProcess:
+        worker.kill()
+        fresh = ScraperProcess(self._ctx, worker.index)
+        self.workers[self.workers.index(worker)] = fresh
+        return fresh
+
+    async def submit(self, url: str) -> Dict:
+        worker = await self._idle.get()
+        try:
+            return await worker.run(url, self.timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Tarayıcı işçisi {worker.index} {self.timeout}sn'de bitmedi, öldürülüyor: {url}")
+            worker = self._replace(worker)
+            return {**empty_result(), 'error': 'timeout'}
+        except (EOFError, OSError) as e:
+            logger.error(f"Tarayıcı işçisi {worker.index} çöktü: {e}")
+            worker = self._replace(worker)
+            return empty_result()
         finally:
-            driver.quit()
-        return result
-    return await loop.run_in_executor(None, sync_process)
+            self._idle.put_nowait(worker)
+
+    async def close(self):
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(None, w.stop) for w in self.workers))
+        self.workers.clear()
+
+scraper_pool: Optional[ScraperPool] = None
+
+# --- HTTP MOTORU ---
+# Sayfaya gömülü ürün JSON'undan (viewPayload / JSON-LD) isim, fiyat, görsel ve bedenleri
+# tarayıcı açmadan okur. Çözülemeyen sayfalar Selenium'a düşer.
+IN_STOCK_STATES = ('in_stock', 'low_on_stock')
+http_client: Optional[httpx.AsyncClient] = None
+
+def get_http_client() -> httpx.AsyncClient:
+    global http_client
+    if http_client is None:
+        http_client = httpx.AsyncClient(
+            headers={'User-Agent': USER_AGENT, 'Accept-Language': 'tr-TR,tr;q=0.9'},
+            limits=httpx.Limits(max_connections=10, max_keepalive_connections=10, keepalive_expiry=60),
+            timeout=httpx.Timeout(15.0), follow_redirects=True,
+        )
+    return http_client
+
+def format_price(amount, currency: str = 'TRY', divisor: int = 1) -> str:
+    try: value = float(amount) / divisor
+    except (TypeError, ValueError): return str(amount)
+    text = f"{value:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+    return f"{text} TL" if currency in ('TRY', 'TL') else f"{text} {currency}"
+
+def _find_meta(page: str, prop: str) -> Optional[str]:
+    for pattern in (rf'<meta[^>]+property=["\']{prop}["\'][^>]*content=["\']([^"\']*)',
+                    rf'<meta[^>]+content=["\']([^"\']*)["\'][^>]*property=["\']{prop}["\']'):
+        match = re.search(pattern, page, re.I)
+        if match: return html_lib.unescape(match.group(1))
+    return None
+
+def _json_ld_products(page: str) -> List[Dict]:
+    products = []
+    for raw in re.findall(r'<script[^>]+type=["\']application/ld\+json["\'][^>]*>(.*?)</script>', page, re.S | re.I):
+        try: data = json.loads(raw)
+        except ValueError: continue
+        items = data if isinstance(data, list) else data.get('@graph', [data])
+        products += [i for i in items if isinstance(i, dict) and i.get('@type') == 'Product']
+    return products
+
+def _view_payload(page: str) -> Optional[Dict]:
+    match = re.search(r'window\.zara\.viewPayload\s*=\s*(\{.*?\});?\s*</script>', page, re.S)
+    if not match: return None
+    try: return json.loads(match.group(1))
+    except ValueError: return None
+
+def parse_product_page(page: str, url: str = '') -> Optional[Dict]:
+    result = empty_result()
+    h1 = re.search(r'<h1[^>]*>(.*?)</h1>', page, re.S | re.I)
+    name = re.sub(r'<[^>]+>', '', h1.group(1)).strip() if h1 else None
+    image = _find_meta(page, 'og:image')
+    sizes = None # [(isim, stokta_mı)]
+    price = None
+
+    payload = _view_payload(page)
+    product = (payload or {}).get('product') if isinstance(payload, dict) else None
+    if isinstance(product, dict):
+        colors = product.get('detail', {}).get('colors') or []
+        wanted = parse_qs(urlparse(url).query).get('v1', [''])[0]
+        color = next((c for c in colors if wanted and str(c.get('productId')) == wanted), colors[0] if colors else None)
+        name = product.get('name') or name
+        if color:
+            if color.get('price') is not None: price = format_price(color['price'], divisor=100) # viewPayload fiyatı kuruş cinsinden
+            sizes = [(sz.get('name', ''), sz.get('availability') in IN_STOCK_STATES) for sz in color.get('sizes', [])]
+
+    if sizes is None:
+        ld = _json_ld_products(page)
+        if ld:
+            sizes = []
+            for item in ld:
+                offers = item.get('offers') or {}
+                if isinstance(offers, list): offers = offers[0] if offers else {}
+                in_stock = str(offers.get('availability', '')).endswith('InStock')
+                sizes.append((str(item.get('size') or ''), in_stock))
+                if price is None and offers.get('price') is not None: price = format_price(offers['price'], offers.get('priceCurrency', 'TRY'))
+                name = name or item.get('name')
+                if not image:
+                    img = item.get('image')
+                    image = img[0] if isinstance(img, list) and img else (img if isinstance(img, str) else None)
+
+    # Beden bilgisi yoksa bu sayfayı çözemedik demektir
+    if sizes is None or not name: return None
+
+    result['name'] = html_lib.unescape(name)
+    result['category'] = detect_category(result['name'])
+    # Giyimde isimli beden yoksa (ör. size alanı olmayan JSON-LD) stok bilgisi güvenilmez; Selenium'a bırak
+    if result['category'] != 'accessory' and not any(n.strip() for n, _ in sizes): return None
+    if price: result['price'] = price
+    if image: result['image'] = image.split("?")[0]
+    available = [clean_size_text(n) for n, ok in sizes if ok]
+    if result['category'] == 'accessory':
+        result['sizes'] = ['Standart'] if any(ok for _, ok in sizes) else []
+    else:
+        result['sizes'] = [n for n in available if n]
+    result['availability'] = 'in_stock' if result['sizes'] else 'out_of_stock'
+    result['status'] = 'success'
+    return result
+
+async def check_stock_http(url: str) -> Optional[Dict]:
+    url = normalize_url(url)
+    try:
+        with timings.stage('http_fetch'): response = await get_http_client().get(url)
+    except httpx.HTTPError as e:
+        logger.warning(f"HTTP hatası: {e}")
+        return None
+    if response.status_code != 200: return None
+    try:
+        with timings.stage('http_parse'): return parse_product_page(response.text, url)
+    except Exception as e:
+        logger.warning(f"Sayfa çözümlenemedi ({url}): {e}")
+        return None
+
+async def check_stock(url: str):
+    if FETCH_ENGINE == 'http':
+        data = await check_stock_http(url)
+        if data: return data
+    return await check_stock_selenium(url)
+
+# --- UYARLANABİLİR ZAMANLAYICI ---
+# Her tekil ürünün bir sonraki kontrol zamanı öncelik kuyruğunda tutulur. Durumu değişen veya
+# yeni eklenen ürünler sık, uzun süre aynı kalan veya hata verenler giderek seyrek kontrol edilir.
+class PollScheduler:
+    def __init__(self, base: float, minimum: float, maximum: float, per_minute: float):
+        self.base = base
+        self.minimum = min(minimum, base)
+        self.maximum = max(maximum, base)
+        self.rate = per_minute / 60.0
+        self.budget = per_minute
+        self.capacity = max(1.0, per_minute)
+        self.updated = time.monotonic()
+        self.heap: List[tuple] = []
+        self.state: Dict[str, Dict] = {}
+        self.load: Counter = Counter() # Kullanıcı başına ürün sayısı
+        self.last_turn: Dict[str, int] = {} # Kullanıcının en son sıra aldığı tur numarası
+        self.turn = 0
+
+    def _push(self, pkey: str, due: float):
+        self.state[pkey]['due'] = due
+        heapq.heappush(self.heap, (due, pkey))
+
+    def sync(self, index: Dict[str, Dict]):
+        now = time.monotonic()
+        for pkey in index:
+            if pkey not in self.state:
+                self.state[pkey] = {'interval': self.minimum, 'errors': 0, 'signature': None}
+                self._push(pkey, now)
+            self.state[pkey]['owners'] = index[pkey].get('users', [])
+        for pkey in [p for p in self.state if p not in index]:
+            del self.state[pkey] # Yığındaki eski kayıt pop sırasında atlanır
+        self.load = Counter(u for entry in self.state.values() for u in entry['owners'])
+
+    # Ortak ürün, en az ürünü olan sahibinin şeridine girer
+    def _lane(self, entry: Dict) -> str:
+        return min(entry.get('owners') or [''], key=lambda u: (self.load.get(u, 0), u))
+
+    def pop_due(self) -> List[str]:
+        now = time.monotonic()
+        self.budget = min(self.capacity, self.budget + (now - self.updated) * self.rate)
+        self.updated = now
+        # Zamanı gelenler kullanıcı şeritlerine ayrılır ve şeritlerden sırayla birer ürün alınır; 300 ürünlü
+        # bir kullanıcı bütçeyi tek başına tüketemez. Bu tur sıra gelmeyen şeritler bir sonraki turda öne geçer.
+        lanes: Dict[str, List[tuple]] = {}
+        while self.heap and self.heap[0][0] <= now:
+            when, pkey = heapq.heappop(self.heap)
+            entry = self.state.get(pkey)
+            if entry is None or entry['due'] != when: continue
+            lanes.setdefault(self._lane(entry), []).append((when, pkey))
+        order = sorted(lanes, key=lambda u: self.last_turn.get(u, -1))
+        for lane in lanes.values(): lane.reverse() # pop() en eski olanı versin
+        due = []
+        while self.budget >= 1 and any(lanes[u] for u in order):
+            for user in order:
+                if self.budget < 1: break
+                if not lanes[user]: continue
+                when, pkey = lanes[user].pop()
+                self.state[pkey]['due'] = None
+                self.budget -= 1
+                self.turn += 1
+                self.last_turn[user] = self.turn
+                due.append(pkey)
+        for lane in lanes.values():
+            for item in lane: heapq.heappush(self.heap, item)
+        return due
+
+    def backlog(self) -> int:
+        now = time.monotonic()
+        return sum(1 for p in self.state.values() if p['due'] is not None and p['due'] <= now)
+
+    def hourly_load(self, user_id: str) -> float:
+        return sum(3600.0 / e['interval'] / len(e['owners']) for e in self.state.values() if user_id in e.get('owners', ()))
+
+    def record(self, pkey: str, data: Dict):
+        entry = self.state.get(pkey)
+        if entry is None: return
+        if data['status'] == 'error':
+            entry['errors'] += 1
+            entry['interval'] = min(self.maximum, max(self.base, entry['interval'] * 2))
+        else:
+            signature = snapshot_hash(snapshot_of(data))
+            changed = entry['signature'] is not None and signature != entry['signature']
+            entry['signature'] = signature
+            entry['errors'] = 0
+            entry['interval'] = self.minimum if changed else min(self.maximum, entry['interval'] * 2)
+        # Hepsi aynı anda dolmasın diye biraz sapma
+        self._push(pkey, time.monotonic() + entry['interval'] * random.uniform(0.9, 1.1))
+
+poll_scheduler = PollScheduler(CHECK_INTERVAL, MIN_CHECK_INTERVAL, MAX_CHECK_INTERVAL, CHECKS_PER_MINUTE)
 
 def create_ui(data, url, target_sizes, last_check_time=None):
     available_targets = []
@@ -240,36 +1129,130 @@ def create_ui(data, url, target_sizes, last_check_time=None):
     )
     return caption
 
+# --- ÜRÜN EKLEME ---
+def parse_target_sizes(raw_text: str) -> List[str]:
+    raw_text = raw_text.upper().strip()
+    if "HEPSI" in raw_text or "TÜMÜ" in raw_text: return ['HEPSI']
+    return [p.strip() for p in raw_text.replace(" ", ",").split(",") if p.strip()]
+
+def add_tracked_product(user_id: int, chat_id: int, url: str, check_data: Dict, target_sizes: List[str], category: str, save: bool = True) -> str:
+    if category == 'accessory':
+        target_sizes = ['STANDART']
+        initial_status = check_data['availability']
+    else:
+        initial_status = 'out_of_stock'
+        if 'HEPSI' in target_sizes:
+            if check_data['availability'] == 'in_stock': initial_status = 'in_stock_target'
+        else:
+            matches = [s for s in check_data['sizes'] if s.upper() in target_sizes]
+            if matches: initial_status = 'in_stock_target'
+
+    key = f"{user_id}_{datetime.now().timestamp()}"
+    while key in tracked_products: key += "0" # Toplu eklemede aynı ana denk gelirse
+    tracked_products[key] = {
+        'url': url, 'name': check_data['name'], 'price': check_data['price'], 'image': check_data['image'],
+        'last_status': initial_status, 'target_sizes': target_sizes, 'last_check': datetime.now(),
+        'chat_id': chat_id, 'user_id': str(user_id), 'category': category
+    }
+    if save: store.save_product(key, tracked_products[key])
+    return key
+
+# --- KULLANICI KOTALARI ---
+# Kotalar known_users içinde kişiye özel saklanır (max_products, refresh_per_hour); yoksa varsayılan geçerli.
+QUOTA_FIELDS = {'p': ('max_products', USER_MAX_PRODUCTS, [10, 25, 50, 100, 300, 0]),
+                'r': ('refresh_per_hour', USER_REFRESH_PER_HOUR, [10, 30, 60, 120, 0])}
+refresh_log: Dict[str, deque] = {}
+user_costs: Dict[str, Dict[str, float]] = {} # Açılıştan beri {user_id: {'scrapes': ..., 'refreshes': ...}}
+
+def user_quota(user_id: str, kind: str) -> int:
+    if user_id == ADMIN_ID: return 0
+    field, default, _ = QUOTA_FIELDS[kind]
+    return int(known_users.get(user_id, {}).get(field, default))
+
+def product_slots_left(user_id: str) -> Optional[int]:
+    limit = user_quota(user_id, 'p')
+    if not limit: return None
+    return max(0, limit - store.count_user_products(user_id))
+
+def recent_refreshes(user_id: str) -> int:
+    log = refresh_log.setdefault(user_id, deque())
+    now = time.monotonic()
+    while log and now - log[0] > 3600: log.popleft()
+    return len(log)
+
+def take_refresh(user_id: str) -> bool:
+    limit = user_quota(user_id, 'r')
+    if limit and recent_refreshes(user_id) >= limit: return False
+    refresh_log.setdefault(user_id, deque()).append(time.monotonic())
+    user_costs.setdefault(user_id, {'scrapes': 0.0, 'refreshes': 0})['refreshes'] += 1
+    return True
+
+# Ortak ürünün taraması takipçileri arasında bölünür
+def charge_users(users: List[str]):
+    share = 1.0 / max(1, len(users))
+    for uid in users: user_costs.setdefault(uid, {'scrapes': 0.0, 'refreshes': 0})['scrapes'] += share
+
 # --- ADMIN PANELİ ---
+ADMIN_MENU_TEXT = "👮‍♂️ <b>Admin Paneli</b>"
+
+def admin_menu_keyboard() -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup([[InlineKeyboardButton("👥 Kullanıcılar", callback_data="adm_list_users")], [InlineKeyboardButton("❌ Kapat", callback_data="adm_close")]])
+
 async def admin_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = str(update.effective_user.id)
     if user_id != ADMIN_ID: return 
-    keyboard = [[InlineKeyboardButton("👥 Kullanıcılar", callback_data="adm_list_users")], [InlineKeyboardButton("❌ Kapat", callback_data="adm_close")]]
-    await update.message.reply_text("👮‍♂️ <b>Admin Paneli</b>", reply_markup=InlineKeyboardMarkup(keyboard), parse_mode=ParseMode.HTML)
+    await update.message.reply_text(ADMIN_MENU_TEXT, reply_markup=admin_menu_keyboard(), parse_mode=ParseMode.HTML)
 
 async def admin_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     data = query.data
     if not data.startswith("adm_"): return 
+    if str(query.from_user.id) != ADMIN_ID: await query.answer(); return
     await query.answer()
     if data == "adm_close": await query.delete_message(); return
     if data == "adm_list_users":
         if not known_users: await query.edit_message_text("Boş."); return
         keyboard = []
-        for uid, udata in known_users.items(): keyboard.append([InlineKeyboardButton(f"👤 {udata.get('name')}", callback_data=f"adm_view_{uid}")])
+        for uid, udata in known_users.items(): keyboard.append([InlineKeyboardButton(f"👤 {udata.get('name')} ({store.count_user_products(uid)})", callback_data=f"adm_view_{uid}")])
         keyboard.append([InlineKeyboardButton("🔙 Geri", callback_data="adm_menu")])
         await query.edit_message_text("👥 <b>Kullanıcılar:</b>", reply_markup=InlineKeyboardMarkup(keyboard), parse_mode=ParseMode.HTML)
     elif data.startswith("adm_view_"):
-        target_id = data.replace("adm_view_", "")
-        user_products = {k: v for k, v in tracked_products.items() if v['user_id'] == target_id}
-        info_text = f"👤 ID: {target_id}\n📦 Ürün Sayısı: {len(user_products)}"
-        keyboard = [[InlineKeyboardButton("📩 Mesaj", callback_data=f"adm_msg_{target_id}")], [InlineKeyboardButton("🔙", callback_data="adm_list_users")]]
-        await query.edit_message_text(info_text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode=ParseMode.HTML)
+        await admin_view_user(query, data.replace("adm_view_", ""))
+    elif data.startswith("adm_quota_"):
+        kind, target_id = data.replace("adm_quota_", "").split("_", 1)
+        field, default, choices = QUOTA_FIELDS[kind]
+        label = "📦 Ürün kotası" if kind == 'p' else "🔄 Saatlik yenileme kotası"
+        buttons = [InlineKeyboardButton("∞" if n == 0 else str(n), callback_data=f"adm_set_{kind}_{n}_{target_id}") for n in choices]
+        keyboard = [buttons[:3], buttons[3:], [InlineKeyboardButton(f"Varsayılan ({default or '∞'})", callback_data=f"adm_set_{kind}_d_{target_id}")],
+                    [InlineKeyboardButton("🔙", callback_data=f"adm_view_{target_id}")]]
+        await query.edit_message_text(f"{label} — <b>{target_id}</b>\nŞu an: {user_quota(target_id, kind) or '∞'}", reply_markup=InlineKeyboardMarkup(keyboard), parse_mode=ParseMode.HTML)
+    elif data.startswith("adm_set_"):
+        kind, value, target_id = data.replace("adm_set_", "").split("_", 2)
+        field = QUOTA_FIELDS[kind][0]
+        udata = known_users.setdefault(target_id, {})
+        if value == "d": udata.pop(field, None)
+        else: udata[field] = int(value)
+        store.save_user(target_id, udata)
+        await admin_view_user(query, target_id)
     elif data.startswith("adm_msg_"):
         target_id = data.replace("adm_msg_", "")
         admin_reply_mode[ADMIN_ID] = target_id 
         await query.edit_message_text(f"✍️ <b>{target_id}</b>'ye yaz:", parse_mode=ParseMode.HTML)
-    elif data == "adm_menu": await admin_command(update, context)
+    elif data == "adm_menu": await query.edit_message_text(ADMIN_MENU_TEXT, reply_markup=admin_menu_keyboard(), parse_mode=ParseMode.HTML)
+
+async def admin_view_user(query, target_id: str):
+    count = store.count_user_products(target_id)
+    cost = user_costs.get(target_id, {'scrapes': 0.0, 'refreshes': 0})
+    load = poll_scheduler.hourly_load(target_id)
+    total_load = sum(3600.0 / e['interval'] for e in poll_scheduler.state.values()) or 1.0
+    product_limit, refresh_limit = user_quota(target_id, 'p'), user_quota(target_id, 'r')
+    info_text = (f"👤 ID: {target_id}\n📦 Ürün Sayısı: {count} / {product_limit or '∞'}\n"
+                 f"🔄 Yenileme: son 1 saatte {recent_refreshes(target_id)} / {refresh_limit or '∞'}\n"
+                 f"⚙️ Tarama yükü: ~{load:.0f}/saat (toplamın %{100 * load / total_load:.0f}'i)\n"
+                 f"🧾 Açılıştan beri: {cost['scrapes']:.1f} tarama, {cost['refreshes']} yenileme")
+    keyboard = [[InlineKeyboardButton("📦 Ürün kotası", callback_data=f"adm_quota_p_{target_id}"), InlineKeyboardButton("🔄 Yenileme kotası", callback_data=f"adm_quota_r_{target_id}")],
+                [InlineKeyboardButton("📩 Mesaj", callback_data=f"adm_msg_{target_id}")], [InlineKeyboardButton("🔙", callback_data="adm_list_users")]]
+    await query.edit_message_text(info_text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode=ParseMode.HTML)
 
 # --- GENEL HANDLERS ---
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -283,7 +1266,7 @@ async def list_products(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.effective_message.reply_text("Listeye bakmaya üşendim şuan ya... 🥱")
     await asyncio.sleep(2)
     user_id = str(update.effective_user.id)
-    my_products = {k: v for k, v in tracked_products.items() if v['user_id'] == user_id}
+    my_products = {k: tracked_products[k] for k in store.user_product_keys(user_id) if k in tracked_products}
     if not my_products: await update.effective_message.reply_text("Şaka şaka... Listen boş aşkım."); return
     await update.effective_message.reply_text("Şaka şaka aşkım 🥰 İşte listen:")
     for k, v in my_products.items():
@@ -297,17 +1280,27 @@ async def list_products(update: Update, context: ContextTypes.DEFAULT_TYPE):
             else: is_happy = (v['last_status'] == 'in_stock_target')
             target_str = "Tümü" if 'HEPSI' in v['target_sizes'] else ",".join(v['target_sizes'])
 
+        # Önbellekte güncel sonuç varsa tarama yapmadan onu göster
+        cached = result_cache.get(v['url'])
+        sizes_line = ""
+        last_check = v.get('last_check', datetime.now())
+        if cached:
+            is_happy = is_target_available(v, cached[0])
+            last_check = max(last_check, cached[2])
+            if v.get('category') != 'accessory': sizes_line = f"📏 Mevcut: {', '.join(cached[0]['sizes']) or '-'}\n"
+
         icon = "🟢" if is_happy else "🔴"
-        last_check = v.get('last_check', datetime.now()) + timedelta(hours=2)
-        time_str = last_check.strftime("%H:%M")
-        text = f"{icon} <b>{v['name']}</b>\n🕒 <i>{time_str}</i>\n🎯 Hedef: {target_str}\n🔗 <a href='{v['url']}'>Link</a>"
+        time_str = (last_check + timedelta(hours=2)).strftime("%H:%M")
+        text = f"{icon} <b>{v['name']}</b>\n🕒 <i>{time_str}</i>\n🎯 Hedef: {target_str}\n{sizes_line}🔗 <a href='{v['url']}'>Link</a>"
         keyboard = [[InlineKeyboardButton("🗑️ Sil", callback_data=f"del_{k}")]]
         await update.effective_message.reply_text(text, parse_mode=ParseMode.HTML, reply_markup=InlineKeyboardMarkup(keyboard), disable_web_page_preview=True)
 
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = str(update.effective_user.id)
     text = update.message.text
-    if user_id not in known_users: known_users[user_id] = {'name': update.effective_user.first_name}
+    if user_id not in known_users:
+        known_users[user_id] = {'name': update.effective_user.first_name}
+        store.save_user(user_id, known_users[user_id])
     
     if user_id == ADMIN_ID and user_id in admin_reply_mode:
         target_user = admin_reply_mode.pop(user_id)
@@ -317,8 +1310,14 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     if not await is_authorized(update): return
 
+    uid_int = update.effective_user.id
+    if waiting_for_import.pop(uid_int, False) or len(ZARA_LINK_RE.findall(text)) > 1:
+        rows = parse_import_text(text)
+        if rows: await run_import(update, context, rows); return
+
     if "zara.com" in text:
-        uid_int = update.effective_user.id
+        limit_left = product_slots_left(user_id)
+        if limit_left == 0: await update.message.reply_text(f"📦 Listen dolu aşkım ({user_quota(user_id, 'p')} ürün). Önce birini sil."); return
         pending_adds[uid_int] = text
         if uid_int in waiting_for_sizes: del waiting_for_sizes[uid_int]
         keyboard = [[InlineKeyboardButton("Evet çok seviyorum ❤️", callback_data="love_yes")], [InlineKeyboardButton("Hayır ⚠️", callback_data="love_no")]]
@@ -341,11 +1340,11 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if user_id not in pending_adds: await query.edit_message_text("⚠️ Link zaman aşımı."); return
         url = pending_adds.pop(user_id)
         
-        await query.edit_message_text("🥰 <b>Ben de seni çok seviyorum aşkımmm!</b>\n\nÜrünü analiz ediyorum, 10sn bekle...", parse_mode=ParseMode.HTML)
+        await query.edit_message_text("🥰 <b>Ben de seni çok seviyorum aşkımmm!</b>\n\nÜrünü analiz ediyorum, birkaç saniye bekle...", parse_mode=ParseMode.HTML)
         await context.bot.send_chat_action(chat_id=user_id, action="typing")
         
         # --- İLK ANALİZ ---
-        check_data = await check_stock_selenium(url)
+        check_data = await scrape_queue.fetch(url, PRIORITY_INTERACTIVE)
         
         if check_data['status'] == 'error':
             await context.bot.send_message(user_id, "⚠️ Siteye giremedim aşkım.")
@@ -355,12 +1354,7 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         # ÇANTA/AKSESUAR İSE DİREKT EKLE
         if cat == 'accessory':
-            key = f"{user_id}_{datetime.now().timestamp()}"
-            tracked_products[key] = {
-                'url': url, 'name': check_data['name'], 'price': check_data['price'], 'image': check_data['image'],
-                'last_status': check_data['availability'], 'target_sizes': ['STANDART'], 'last_check': datetime.now(),
-                'chat_id': user_id, 'user_id': str(user_id), 'category': 'accessory'
-            }
+            key = add_tracked_product(user_id, user_id, url, check_data, ['STANDART'], 'accessory')
             caption = create_ui(check_data, url, ['STANDART'], datetime.now())
             keyboard = [[InlineKeyboardButton("🔄", callback_data=f"refresh_{key}"), InlineKeyboardButton("❌", callback_data=f"del_{key}")], [InlineKeyboardButton("📋 Listem", callback_data="show_list")]]
             if check_data['image']: await context.bot.send_photo(user_id, photo=check_data['image'], caption=caption, parse_mode=ParseMode.HTML, reply_markup=InlineKeyboardMarkup(keyboard))
@@ -382,7 +1376,7 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     elif data == "show_list": await list_products(update, context)
     elif data.startswith("del_"):
         key = data.replace("del_", "")
-        if key in tracked_products: del tracked_products[key]; await query.delete_message(); await context.bot.send_message(query.message.chat_id, "🗑️ Silindi.")
+        if key in tracked_products: del tracked_products[key]; store.delete_product(key); await query.delete_message(); await context.bot.send_message(query.message.chat_id, "🗑️ Silindi.")
         else:
             try: await query.edit_message_text("Zaten yok.")
             except: pass
@@ -390,57 +1384,69 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     elif data.startswith("refresh_"):
         key = data.replace("refresh_", "")
         if key in tracked_products:
-            await context.bot.send_chat_action(chat_id=query.message.chat_id, action="typing")
             product = tracked_products[key]
-            check_data = await check_stock_selenium(product['url'])
-            tracked_products[key]['last_check'] = datetime.now()
-            
-            if check_data['status'] == 'success':
-                tracked_products[key]['last_status'] = check_data['availability']
-                new_caption = create_ui(check_data, product['url'], product['target_sizes'], tracked_products[key]['last_check'])
-                try: await query.edit_message_caption(caption=new_caption, parse_mode=ParseMode.HTML, reply_markup=query.message.reply_markup)
-                except: pass
+            cached = result_cache.get(product['url'])
+            stale = not cached or cached[1] >= RESULT_CACHE_TTL
+            # Yenileme kotası sadece gerçekten tarama gerekiyorsa düşer; dolduysa eldeki sonuç gösterilir
+            if stale and not take_refresh(str(user_id)):
+                if not cached:
+                    await context.bot.send_message(query.message.chat_id, "⏳ Saatlik yenileme hakkın doldu aşkım, biraz sonra tekrar bak."); return
+                stale = False
+            if cached:
+                # Önbellekteki sonucu hemen göster, eskiyse arkadan tazele
+                check_data, age, checked_at = cached
+                if stale: context.application.create_task(revalidate_refresh(context, query, key))
             else:
-                try: await context.bot.send_message(query.message.chat_id, "⚠️ Hata oluştu.")
-                except: pass
+                await context.bot.send_chat_action(chat_id=query.message.chat_id, action="typing")
+                check_data = await scrape_queue.fetch(product['url'], PRIORITY_INTERACTIVE)
+                checked_at = datetime.now()
+            await apply_refresh(context, query, key, check_data, checked_at)
+
+async def apply_refresh(context: ContextTypes.DEFAULT_TYPE, query, key: str, check_data: Dict, checked_at: datetime):
+    if key not in tracked_products: return
+    product = tracked_products[key]
+    product['last_check'] = checked_at
+    if check_data['status'] == 'success':
+        product['last_status'] = 'in_stock_target' if is_target_available(product, check_data) else 'out_of_stock'
+        product.pop('snapshot', None) # Sonraki kontrol turu bu takipçiyi yeniden değerlendirsin
+        store.save_product(key, product)
+        new_caption = create_ui(check_data, product['url'], product['target_sizes'], checked_at)
+        try: await query.edit_message_caption(caption=new_caption, parse_mode=ParseMode.HTML, reply_markup=query.message.reply_markup)
+        except: pass
+    else:
+        try: await context.bot.send_message(query.message.chat_id, "⚠️ Hata oluştu.")
+        except: pass
+
+async def revalidate_refresh(context: ContextTypes.DEFAULT_TYPE, query, key: str):
+    if key not in tracked_products: return
+    fresh = await scrape_queue.fetch(tracked_products[key]['url'], PRIORITY_REVALIDATE)
+    if fresh['status'] == 'success': await apply_refresh(context, query, key, fresh, datetime.now())
 
 async def process_size_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
-    raw_text = update.message.text.upper().strip()
     if user_id not in waiting_for_sizes: return
     
     saved_data = waiting_for_sizes[user_id]
     url = saved_data['url']
     cat = saved_data['category']
 
-    target_sizes = []
-    if "HEPSI" in raw_text or "TÜMÜ" in raw_text: target_sizes = ['HEPSI']
-    else: target_sizes = [p.strip() for p in raw_text.replace(" ", ",").split(",") if p.strip()]
+    target_sizes = parse_target_sizes(update.message.text)
     
     if not target_sizes: await update.message.reply_text("⚠️ Anlamadım aşkım tekrar yaz."); return
     del waiting_for_sizes[user_id]
+    if product_slots_left(str(user_id)) == 0: await update.message.reply_text("📦 Listen dolu aşkım. Önce birini sil."); return
 
     await update.message.reply_text(f"Tamamdır, <b>{', '.join(target_sizes)}</b> için bakıyorum...", parse_mode=ParseMode.HTML)
     
-    check_data = await check_stock_selenium(url)
+    # İlk analiz yeniyse tekrar çekme
+    cached = result_cache.get(url)
+    check_data = cached[0] if cached and cached[1] < ANALYSIS_CACHE_TTL else await scrape_queue.fetch(url, PRIORITY_INTERACTIVE)
     
     if check_data['status'] == 'error':
         await update.message.reply_text("⚠️ Siteye giremedim bebeğim, sonra deneriz.")
         return
 
-    initial_status = 'out_of_stock'
-    if 'HEPSI' in target_sizes:
-        if check_data['availability'] == 'in_stock': initial_status = 'in_stock_target'
-    else:
-        matches = [s for s in check_data['sizes'] if s.upper() in target_sizes]
-        if matches: initial_status = 'in_stock_target'
-
-    key = f"{user_id}_{datetime.now().timestamp()}"
-    tracked_products[key] = {
-        'url': url, 'name': check_data['name'], 'price': check_data['price'], 'image': check_data['image'],
-        'last_status': initial_status, 'target_sizes': target_sizes, 'last_check': datetime.now(),
-        'chat_id': update.effective_chat.id, 'user_id': str(user_id), 'category': cat
-    }
+    key = add_tracked_product(user_id, update.effective_chat.id, url, check_data, target_sizes, cat)
     
     caption = create_ui(check_data, url, target_sizes)
     keyboard = [[InlineKeyboardButton("🔄", callback_data=f"refresh_{key}"), InlineKeyboardButton("❌", callback_data=f"del_{key}")], [InlineKeyboardButton("📋 Listem", callback_data="show_list")]]
@@ -448,55 +1454,902 @@ async def process_size_input(update: Update, context: ContextTypes.DEFAULT_TYPE)
     if check_data['image']: await update.message.reply_photo(photo=check_data['image'], caption=caption, parse_mode=ParseMode.HTML, reply_markup=InlineKeyboardMarkup(keyboard))
     else: await update.message.reply_text(text=caption, parse_mode=ParseMode.HTML, reply_markup=InlineKeyboardMarkup(keyboard))
 
+# --- TOPLU İÇE / DIŞA AKTARMA ---
+IMPORT_MAX_BYTES = 512 * 1024
+IMPORT_PROGRESS_INTERVAL = 2.0
+EXPORT_FIELDS = ['url', 'target_sizes', 'category', 'name', 'last_status']
+ZARA_LINK_RE = re.compile(r"(?:https?://)?(?:[\w-]+\.)*zara\.com/\S+", re.IGNORECASE)
+
+# Her satır: "link [bedenler]" -> [(link, bedenler)]; beden yoksa HEPSI
+def parse_import_text(text: str) -> List[tuple]:
+    rows = []
+    for line in text.splitlines():
+        match = ZARA_LINK_RE.search(line)
+        if not match: continue
+        rest = line[match.end():].strip() # Linkten önceki serbest metin beden sayılmaz
+        sizes = [x for x in parse_target_sizes(rest) if len(x) <= 6] if rest else []
+        rows.append((match.group(0), sizes or ['HEPSI']))
+    return rows
+
+def parse_import_file(raw: bytes, filename: str) -> List[tuple]:
+    text = raw.decode('utf-8-sig', errors='replace')
+    stripped = text.lstrip()
+    if filename.lower().endswith('.json') or stripped.startswith(('[', '{')):
+        data = json.loads(text)
+        if isinstance(data, dict): data = data.get('products', [])
+        rows = []
+        for item in data:
+            if isinstance(item, str): rows.append((item, ['HEPSI'])); continue
+            if not isinstance(item, dict) or not item.get('url'): continue
+            sizes = item.get('target_sizes') or item.get('sizes') or ['HEPSI']
+            if isinstance(sizes, str): sizes = parse_target_sizes(sizes)
+            rows.append((str(item['url']), [str(x).upper() for x in sizes] or ['HEPSI']))
+        return rows
+    reader = list(csv.reader(io.StringIO(text)))
+    if not reader: return []
+    header = [c.strip().lower() for c in reader[0]]
+    if 'url' in header:
+        url_col = header.index('url')
+        size_col = header.index('target_sizes') if 'target_sizes' in header else None
+        rows = []
+        for row in reader[1:]:
+            if len(row) <= url_col or not row[url_col].strip(): continue
+            sizes = row[size_col].strip() if size_col is not None and len(row) > size_col else ''
+            rows.append((row[url_col].strip(), parse_target_sizes(sizes) if sizes else ['HEPSI']))
+        return rows
+    return parse_import_text("\n".join(" ".join(row) for row in reader))
+
+async def run_import(update: Update, context: ContextTypes.DEFAULT_TYPE, rows: List[tuple]):
+    user_id = update.effective_user.id
+    chat_id = update.effective_chat.id
+    message = update.effective_message
+
+    owned = {product_key(tracked_products[k]['url']) for k in store.user_product_keys(str(user_id)) if k in tracked_products}
+    jobs, seen, invalid, duplicate = [], set(), 0, 0
+    for url, sizes in rows:
+        if not is_zara_link(url): invalid += 1; continue
+        url = normalize_url(url)
+        pkey = product_key(url)
+        if pkey in owned or pkey in seen: duplicate += 1; continue
+        seen.add(pkey)
+        jobs.append((url, sizes))
+
+    if not jobs:
+        await message.reply_text(f"⚠️ Eklenecek yeni ürün yok. (Geçersiz: {invalid}, zaten listede: {duplicate})")
+        return
+    slots = product_slots_left(str(user_id))
+    limit = IMPORT_MAX_ITEMS if slots is None else min(IMPORT_MAX_ITEMS, slots)
+    if limit == 0: await message.reply_text(f"📦 Listen dolu aşkım ({user_quota(str(user_id), 'p')} ürün). Önce birkaçını sil."); return
+    skipped = jobs[limit:]
+    jobs = jobs[:limit]
+
+    total = len(jobs)
+    progress = await message.reply_text(f"📥 {total} ürün ekleniyor... 0/{total}")
+    done = 0
+    added, failed = {}, []
+
+    async def import_one(url: str, sizes: List[str]):
+        nonlocal done
+        try: data = await scrape_queue.fetch(url, PRIORITY_BULK)
+        except Exception as e: logger.error(f"İçe aktarma hatası ({url}): {e}"); data = empty_result()
+        if data['status'] == 'error': failed.append(url)
+        else:
+            cat = detect_category(data['name'])
+            key = add_tracked_product(user_id, chat_id, url, data, sizes, cat, save=False)
+            added[key] = tracked_products[key]
+        done += 1
+
+    async def report_progress():
+        last = -1
+        while True:
+            await asyncio.sleep(IMPORT_PROGRESS_INTERVAL)
+            if done == last: continue
+            last = done
+            try: await progress.edit_text(f"📥 {total} ürün ekleniyor... {done}/{total}")
+            except TelegramError: pass
+
+    reporter = asyncio.create_task(report_progress())
+    try: await asyncio.gather(*(import_one(url, sizes) for url, sizes in jobs))
+    finally: reporter.cancel()
+    if added: store.save_products(added)
+
+    lines = [f"✅ <b>{len(added)}</b> ürün eklendi."]
+    if duplicate: lines.append(f"↩️ {duplicate} ürün zaten listende, atlandı.")
+    if invalid: lines.append(f"🚫 {invalid} satır Zara linki değil.")
+    if skipped: lines.append(f"✂️ Limit {limit}, {len(skipped)} ürün eklenmedi.")
+    if failed:
+        lines.append(f"⚠️ {len(failed)} ürüne giremedim:")
+        lines += [f"• {html_lib.escape(url)}" for url in failed[:10]]
+    keyboard = [[InlineKeyboardButton("📋 Listem", callback_data="show_list")]]
+    try: await progress.edit_text("\n".join(lines), parse_mode=ParseMode.HTML, reply_markup=InlineKeyboardMarkup(keyboard), disable_web_page_preview=True)
+    except TelegramError: await message.reply_text("\n".join(lines), parse_mode=ParseMode.HTML, reply_markup=InlineKeyboardMarkup(keyboard), disable_web_page_preview=True)
+
+async def import_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not await is_authorized(update): return
+    user_id = update.effective_user.id
+    text = update.message.text or ""
+    parts = text.split(None, 1)
+    rows = parse_import_text(parts[1]) if len(parts) > 1 else []
+    if rows: await run_import(update, context, rows); return
+    waiting_for_import[user_id] = True
+    await update.message.reply_text(
+        "📥 Linkleri her satıra bir tane olacak şekilde yaz ya da CSV/JSON dosyası gönder.\n"
+        "Beden eklemek için: <code>link S,M</code> (boş bırakırsan tüm bedenler)", parse_mode=ParseMode.HTML)
+
+async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not await is_authorized(update): return
+    user_id = update.effective_user.id
+    caption = (update.message.caption or "").strip().lower()
+    if not waiting_for_import.pop(user_id, False) and not caption.startswith("/import"): return
+    document = update.message.document
+    if document.file_size and document.file_size > IMPORT_MAX_BYTES:
+        await update.message.reply_text("⚠️ Dosya çok büyük aşkım."); return
+    try:
+        file = await document.get_file()
+        rows = parse_import_file(bytes(await file.download_as_bytearray()), document.file_name or "")
+    except Exception as e:
+        logger.error(f"İçe aktarma dosyası okunamadı: {e}")
+        await update.message.reply_text("⚠️ Dosyayı okuyamadım, CSV ya da JSON olmalı."); return
+    if not rows: await update.message.reply_text("⚠️ Dosyada Zara linki bulamadım."); return
+    await run_import(update, context, rows)
+
+async def export_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not await is_authorized(update): return
+    user_id = str(update.effective_user.id)
+    items = [tracked_products[k] for k in store.user_product_keys(user_id) if k in tracked_products]
+    if not items: await update.message.reply_text("📭 Listen boş."); return
+
+    fmt = "json" if "json" in (update.message.text or "").lower() else "csv"
+    rows = [{'url': p['url'], 'target_sizes': p.get('target_sizes', []), 'category': p.get('category', 'clothing'),
+             'name': p.get('name', ''), 'last_status': p.get('last_status', '')} for p in items]
+    if fmt == "json":
+        payload = json.dumps({'products': rows}, ensure_ascii=False, indent=2).encode('utf-8')
+    else:
+        out = io.StringIO()
+        writer = csv.DictWriter(out, fieldnames=EXPORT_FIELDS)
+        writer.writeheader()
+        for row in rows: writer.writerow({**row, 'target_sizes': ",".join(row['target_sizes'])})
+        payload = out.getvalue().encode('utf-8-sig')
+    document = io.BytesIO(payload)
+    document.name = f"zara-takip-{datetime.now().strftime('%Y%m%d')}.{fmt}"
+    await update.message.reply_document(document=document, filename=document.name, caption=f"📤 {len(rows)} ürün")
+
+# --- HIZ SINIRI ---
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = None # Döngü başlamadan kilit oluşturmamak için
+
+    async def acquire(self):
+        if self._lock is None: self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+rate_limiters: Dict[str, TokenBucket] = {'zara.com': TokenBucket(ZARA_RATE, ZARA_BURST)}
+
+async def wait_rate_limit(url: str):
+    host = urlparse(url).hostname or ''
+    for domain, bucket in rate_limiters.items():
+        if host == domain or host.endswith('.' + domain):
+            await bucket.acquire()
+            return
+
+# --- SONUÇ ÖNBELLEĞİ ---
+# Son başarılı kontrol sonuçları (LRU). 🔄 ve liste görünümü buradan beslenir.
+class ResultCache:
+    def __init__(self, size: int, max_age: float):
+        self.size = max(1, size)
+        self.max_age = max_age
+        self._items: OrderedDict = OrderedDict() # {product_key: (monotonic, datetime, sonuç)}
+
+    def put(self, url: str, data: Dict):
+        pkey = product_key(url)
+        self._items[pkey] = (time.monotonic(), datetime.now(), data)
+        self._items.move_to_end(pkey)
+        while len(self._items) > self.size: self._items.popitem(last=False)
+
+    def get(self, url: str) -> Optional[tuple]:
+        # (sonuç, yaş_sn, kontrol_zamanı) veya None
+        pkey = product_key(url)
+        item = self._items.get(pkey)
+        if item is None: return None
+        age = time.monotonic() - item[0]
+        if age >= self.max_age:
+            del self._items[pkey]
+            return None
+        self._items.move_to_end(pkey)
+        return item[2], age, item[1]
+
+    def __len__(self):
+        return len(self._items)
+
+result_cache = ResultCache(RESULT_CACHE_SIZE, RESULT_CACHE_MAX_AGE)
+
+# --- ÖNCELİKLİ KONTROL KUYRUĞU ---
+# Tüm kontroller bu kuyruktan geçer. Kullanıcı istekleri (link ekleme, 🔄) arka plan taramasının önüne
+# geçer ve arka plan işleri en fazla CHECK_WORKERS yeri kullanabildiği için kullanıcıya hep yer kalır.
+# Aynı ürün için eşzamanlı istekler tek bir çekimi paylaşır.
+PRIORITY_INTERACTIVE = 0
+PRIORITY_REVALIDATE = 5
+PRIORITY_BULK = 7 # /import: kullanıcı bekliyor ama tek tek eklemelerin önüne geçmesin; yer payı sınırlı
+PRIORITY_BACKGROUND = 10
+
+class ScrapeQueue:
+    def __init__(self, background_slots: int, interactive_slots: int):
+        self.background_slots = max(1, background_slots)
+        self.workers = self.background_slots + max(1, interactive_slots)
+        self.background_running = 0
+        # Toplu içe aktarma arka plan yerlerinin en fazla yarısını tutar ki periyodik tarama durmasın
+        self.bulk_slots = max(1, self.background_slots // 2)
+        self._bulk: Optional[asyncio.Semaphore] = None
+        self.heap: List[tuple] = []
+        self.inflight: Dict[str, Dict] = {}
+        self._seq = 0
+        self._changed: Optional[asyncio.Condition] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def _ensure_started(self):
+        if self._tasks: return
+        self._changed = asyncio.Condition()
+        self._bulk = asyncio.Semaphore(self.bulk_slots)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def depth(self) -> int:
+        return len(self.heap)
+
+    async def fetch(self, url: str, priority: int = PRIORITY_BACKGROUND) -> Dict:
+        self._ensure_started()
+        if priority != PRIORITY_BULK: return await self._enqueue(url, priority)
+        async with self._bulk: return await self._enqueue(url, priority)
+
+    async def _enqueue(self, url: str, priority: int) -> Dict:
+        pkey = product_key(url)
+        entry = self.inflight.get(pkey)
+        if entry is None:
+            entry = {'url': normalize_url(url), 'priority': priority, 'started': False,
+                     'future': asyncio.get_running_loop().create_future()}
+            self.inflight[pkey] = entry
+            await self._push(priority, pkey)
+        elif priority < entry['priority'] and not entry['started']:
+            # Bekleyen iş öne alınır; eski kayıt sırası gelince atlanır
+            entry['priority'] = priority
+            await self._push(priority, pkey)
+        return await asyncio.shield(entry['future'])
+
+    async def _push(self, priority: int, pkey: str):
+        self._seq += 1
+        async with self._changed:
+            heapq.heappush(self.heap, (priority, self._seq, pkey))
+            self._changed.notify()
+
+    def _can_take(self) -> bool:
+        if not self.heap: return False
+        return self.heap[0][0] < PRIORITY_BACKGROUND or self.background_running < self.background_slots
+
+    async def _next(self) -> tuple:
+        async with self._changed:
+            while True:
+                await self._changed.wait_for(self._can_take)
+                priority, _, pkey = heapq.heappop(self.heap)
+                entry = self.inflight.get(pkey)
+                if entry is None or entry['started'] or priority != entry['priority']: continue
+                entry['started'] = True
+                background = priority >= PRIORITY_BACKGROUND
+                if background: self.background_running += 1
+                return pkey, entry, background
+
+    async def _worker(self):
+        while True:
+            pkey, entry, background = await self._next()
+            try:
+                await wait_rate_limit(entry['url'])
+                with timings.stage('check'): data = await check_stock(entry['url'])
+                if data['status'] == 'success': result_cache.put(entry['url'], data)
+                entry['future'].set_result(data)
+            except Exception as e:
+                logger.error(f"Kontrol hatası ({pkey}): {e}")
+                entry['future'].set_result(empty_result())
+            finally:
+                self.inflight.pop(pkey, None)
+                if background:
+                    async with self._changed:
+                        self.background_running -= 1
+                        self._changed.notify_all()
+
+scrape_queue = ScrapeQueue(CHECK_WORKERS, INTERACTIVE_WORKERS)
+
+# --- PARÇALI KONTROL (KOORDİNATÖR / İŞÇİ) ---
+# REMOTE_WORKERS=1 iken bot (koordinatör) arka plan kontrollerini ortak SQLite'taki shard_jobs tablosuna
+# yazar; `python bot.py --worker` ile açılan işçi konteynerleri işleri kiralayıp (lease) sonucu geri yazar.
+# Canlı işçi yoksa kontroller yine yerelde yapılır. Kullanıcı istekleri her zaman yerelde kalır.
+class JobBoard:
+    def __init__(self, poll_interval: float = 0.5, worker_check: float = 5.0):
+        self.poll_interval = poll_interval
+        self.worker_check = worker_check
+        self.waiting: Dict[str, Dict] = {}
+        self.workers = 0
+        self._workers_checked = 0.0
+        self._local: set = set()
+        self._task: Optional[asyncio.Task] = None
+
+    # SQLite (busy_timeout'lu) çağrıları Telegram döngüsünü bekletmesin diye thread'de çalışır
+    async def _db(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    def _start(self):
+        if self._task is None: self._task = asyncio.create_task(self._poll())
+
+    def has_workers(self) -> bool:
+        self._start()
+        return self.workers > 0
+
+    async def fetch(self, url: str, priority: int = PRIORITY_BACKGROUND) -> Dict:
+        self._start()
+        pkey = product_key(url)
+        entry = self.waiting.get(pkey)
+        if entry is None:
+            entry = {'future': asyncio.get_running_loop().create_future(), 'since': time.monotonic(),
+                     'url': normalize_url(url), 'priority': priority}
+            self.waiting[pkey] = entry
+            try: await self._db(store.enqueue_jobs, [(pkey, entry['url'], priority)])
+            except sqlite3.Error as e:
+                logger.error(f"İş tahtası hatası: {e}")
+                self._run_locally([pkey])
+        return await asyncio.shield(entry['future'])
+
+    # İşçi kalmadıysa bekleyen işler SHARD_JOB_TIMEOUT'u beklemeden bu süreçte taranır
+    def _run_locally(self, keys: List[str]):
+        for pkey in keys:
+            entry = self.waiting.pop(pkey, None)
+            if entry is None: continue
+            task = asyncio.create_task(self._fetch_locally(entry))
+            self._local.add(task)
+            task.add_done_callback(self._local.discard)
+
+    async def _fetch_locally(self, entry: Dict):
+        try: result = await scrape_queue.fetch(entry['url'], entry['priority'])
+        except Exception as e:
+            logger.error(f"Yerel kontrol hatası ({entry['url']}): {e}")
+            result = empty_result()
+        if not entry['future'].done(): entry['future'].set_result(result)
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                if time.monotonic() - self._workers_checked > self.worker_check:
+                    self.workers = await self._db(store.live_workers, SHARD_LEASE_SECONDS)
+                    self._workers_checked = time.monotonic()
+                for pkey, result in await self._db(store.collect_results):
+                    entry = self.waiting.pop(pkey, None)
+                    if result.get('status') == 'success': result_cache.put(result.get('url') or pkey, result)
+                    if entry and not entry['future'].done(): entry['future'].set_result(result)
+                if self.waiting and not self.workers:
+                    orphaned = list(self.waiting)
+                    logger.warning(f"Canlı işçi yok, {len(orphaned)} iş yerelde taranıyor")
+                    await self._db(store.drop_jobs, orphaned)
+                    self._run_locally(orphaned)
+                expired = [k for k, e in self.waiting.items() if time.monotonic() - e['since'] > SHARD_JOB_TIMEOUT]
+                if expired:
+                    await self._db(store.drop_jobs, expired)
+                    for pkey in expired:
+                        entry = self.waiting.pop(pkey, None)
+                        if entry is None: continue
+                        logger.warning(f"İşçiden sonuç gelmedi: {pkey}")
+                        if not entry['future'].done(): entry['future'].set_result({**empty_result(), 'error': 'timeout'})
+            except sqlite3.Error as e:
+                logger.error(f"İş tahtası hatası: {e}")
+
+job_board = JobBoard() if REMOTE_WORKERS else None
+
+async def fetch_background(url: str) -> Dict:
+    if job_board and job_board.has_workers(): return await job_board.fetch(url, PRIORITY_BACKGROUND)
+    return await scrape_queue.fetch(url, PRIORITY_BACKGROUND)
+
+async def run_shard_worker():
+    worker_id = f"{socket.gethostname()}-{os.getpid()}"
+    active: Dict[str, asyncio.Task] = {}
+    logger.info(f"Kontrol işçisi başladı: {worker_id}")
+    asyncio.get_running_loop().run_in_executor(None, prune_profile_dirs)
+    if SCRAPER_WORKERS > 0:
+        global scraper_pool
+        scraper_pool = ScraperPool(SCRAPER_WORKERS, SCRAPE_TIMEOUT)
+        scraper_pool.start()
+
+    loop = asyncio.get_running_loop()
+    async def db(fn, *args): return await loop.run_in_executor(None, fn, *args)
+
+    async def run_job(pkey: str, url: str):
+        try: data = await scrape_queue.fetch(url, PRIORITY_BACKGROUND)
+        except Exception as e:
+            logger.error(f"Kontrol hatası ({pkey}): {e}")
+            data = empty_result()
+        # İş yazılana kadar active'de kalır ki kira yenilenmeye devam etsin
+        for attempt in range(SHARD_WRITE_RETRIES):
+            try:
+                await db(store.finish_job, worker_id, pkey, {**data, 'url': url})
+                return
+            except sqlite3.Error as e:
+                logger.error(f"Sonuç yazılamadı ({pkey}, deneme {attempt + 1}): {e}")
+                await asyncio.sleep(2 ** attempt)
+
+    last_beat = 0.0
+    try:
+        while True:
+            claimed = []
+            try:
+                if time.monotonic() - last_beat > SHARD_LEASE_SECONDS / 3:
+                    await db(store.heartbeat, worker_id)
+                    await db(store.renew_leases, worker_id, list(active), SHARD_LEASE_SECONDS)
+                    last_beat = time.monotonic()
+                free = SHARD_BATCH - len(active)
+                if free > 0: claimed = await db(store.claim_jobs, worker_id, free, SHARD_LEASE_SECONDS)
+            except sqlite3.Error as e:
+                logger.error(f"İş tahtası hatası: {e}")
+            for pkey, url in claimed:
+                task = asyncio.create_task(run_job(pkey, url))
+                active[pkey] = task
+                task.add_done_callback(lambda _t, k=pkey: active.pop(k, None))
+            await asyncio.sleep(0.5 if claimed or active else 2)
+    finally:
+        if scraper_pool: await scraper_pool.close()
+        driver_pool.close()
+        if http_client: await http_client.aclose()
+
+# --- BİLDİRİM KUYRUĞU ---
+# Stok alarmları kontrol döngüsünü bekletmeden bu kuyruğa atılır. İşçiler genel ve sohbet başı hız
+# sınırına uyar, RetryAfter gelirse söylenen kadar bekler. Aynı sohbete biriken alarmlar tek mesajda
+# toplanır; bir kez yüklenen ürün görselinin file_id'si sonraki gönderimlerde tekrar kullanılır.
+MAX_MESSAGE_LENGTH = 3800
+
+class Notifier:
+    def __init__(self, workers: int, global_rate: float, chat_interval: float):
+        self.workers = max(1, workers)
+        self.chat_interval = chat_interval
+        self.bucket = TokenBucket(global_rate, max(1, int(global_rate)))
+        self.pending: Dict[int, List[Dict]] = {}
+        self.scheduled: set = set()
+        self.next_allowed: Dict[int, float] = {}
+        self.file_ids: Dict[str, str] = {}
+        self.ready: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self, bot):
+        if self._tasks: return
+        self.ready = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker(bot)) for _ in range(self.workers)]
+
+    def depth(self) -> int:
+        return sum(len(v) for v in self.pending.values())
+
+    def enqueue(self, bot, chat_id: int, caption: str, url: str, image: Optional[str] = None):
+        self.start(bot)
+        self.pending.setdefault(chat_id, []).append({'caption': caption, 'url': url, 'image': image})
+        if chat_id not in self.scheduled:
+            self.scheduled.add(chat_id)
+            self.ready.put_nowait(chat_id)
+
+    async def join(self):
+        if self.ready: await self.ready.join()
+
+    async def _worker(self, bot):
+        while True:
+            chat_id = await self.ready.get()
+            try:
+                wait = self.next_allowed.get(chat_id, 0) - time.monotonic()
+                if wait > 0: await asyncio.sleep(wait)
+                alerts = self.pending.pop(chat_id, [])
+                if alerts: await self._deliver(bot, chat_id, alerts)
+            except Exception as e:
+                logger.error(f"Bildirim işçisi hatası ({chat_id}): {e}")
+            finally:
+                self.next_allowed[chat_id] = time.monotonic() + self.chat_interval
+                if self.pending.get(chat_id): self.ready.put_nowait(chat_id)
+                else: self.scheduled.discard(chat_id)
+                self.ready.task_done()
+
+    @staticmethod
+    def _batches(alerts: List[Dict]) -> List[List[Dict]]:
+        batches, current, size = [], [], 0
+        for alert in alerts:
+            if current and (size + len(alert['caption']) > MAX_MESSAGE_LENGTH or len(current) >= 10):
+                batches.append(current)
+                current, size = [], 0
+            current.append(alert)
+            size += len(alert['caption'])
+        if current: batches.append(current)
+        return batches
+
+    async def _deliver(self, bot, chat_id: int, alerts: List[Dict]):
+        if len(alerts) == 1:
+            await self._send(bot, chat_id, alerts[0])
+            return
+        for batch in self._batches(alerts):
+            text = "\n\n➖➖➖\n\n".join(a['caption'] for a in batch)
+            keyboard = [[InlineKeyboardButton(f"🛒 SATIN AL ({i})", url=a['url'])] for i, a in enumerate(batch, 1)]
+            await self._send(bot, chat_id, {'caption': text, 'url': None, 'image': None, 'keyboard': keyboard})
+
+    async def _send(self, bot, chat_id: int, alert: Dict):
+        keyboard = InlineKeyboardMarkup(alert.get('keyboard') or [[InlineKeyboardButton("🛒 SATIN AL", url=alert['url'])]])
+        image = alert.get('image')
+        while True:
+            await self.bucket.acquire()
+            try:
+                with timings.stage('notify'):
+                    if image:
+                        try:
+                            message = await bot.send_photo(chat_id, photo=self.file_ids.get(image, image), caption=alert['caption'], parse_mode=ParseMode.HTML, reply_markup=keyboard)
+                            if getattr(message, 'photo', None): self.file_ids[image] = message.photo[-1].file_id
+                            return
+                        except RetryAfter: raise
+                        except TelegramError:
+                            self.file_ids.pop(image, None) # Görsel gönderilemezse yazıya düş
+                    await bot.send_message(chat_id, text=alert['caption'], parse_mode=ParseMode.HTML, reply_markup=keyboard)
+                return
+            except RetryAfter as e:
+                delay = e.retry_after.total_seconds() if isinstance(e.retry_after, timedelta) else float(e.retry_after)
+                logger.warning(f"Telegram flood limiti, {delay}sn bekleniyor")
+                await asyncio.sleep(delay)
+            except TelegramError as e:
+                metrics.inc('zara_notification_errors_total')
+                logger.error(f"Bildirim gönderilemedi ({chat_id}): {e}")
+                return
+
+notifier = Notifier(NOTIFY_WORKERS, TG_GLOBAL_RATE, TG_CHAT_INTERVAL)
+
+# --- DEĞİŞİKLİK TESPİTİ ---
+# Her ürünün beden/fiyat/stok durumunun kısa bir özeti (snapshot) ve hash'i tutulur. Hash aynıysa
+# takipçiler değerlendirilmez ve depoya yazılmaz; değiştiyse tipli değişiklik olayları üretilir.
+def snapshot_of(data: Dict) -> Dict:
+    return {'availability': data['availability'], 'sizes': sorted(data['sizes']), 'price': data['price'], 'name': data['name']}
+
+def snapshot_hash(snapshot: Dict) -> str:
+    return hashlib.sha1(json.dumps(snapshot, sort_keys=True, ensure_ascii=False).encode()).hexdigest()[:16]
+
+def parse_price(text) -> Optional[float]:
+    match = re.search(r"\d[\d.,]*", str(text or ''))
+    if not match: return None
+    number = match.group(0)
+    if ',' in number: number = number.replace('.', '').replace(',', '.') # 1.290,00
+    elif number.count('.') > 1 or re.search(r"\.\d{3}$", number): number = number.replace('.', '') # 1.290
+    try: return float(number)
+    except ValueError: return None
+
+def diff_snapshots(old: Optional[Dict], new: Dict) -> List[tuple]:
+    if old is None: return []
+    events = []
+    old_sizes, new_sizes = set(old['sizes']), set(new['sizes'])
+    events += [('size_restocked', s) for s in sorted(new_sizes - old_sizes)]
+    events += [('size_sold_out', s) for s in sorted(old_sizes - new_sizes)]
+    if old['availability'] != new['availability']: events.append(('availability_changed', old['availability'], new['availability']))
+    if old['price'] != new['price']: events.append(('price_changed', old['price'], new['price']))
+    return events
+
+# --- PERİYODİK KONTROL ---
+check_job_running = False
+last_cycle: Dict = {}
+# Tur boyunca biriken yazmalar; tur sonunda tek işlemde depoya basılır
+dirty_products: set = set()
+dirty_snapshots: set = set()
+history_rows: List[tuple] = []
+
+def write_batch(items: Dict, changed: Dict, rows: List[tuple]):
+    store.save_products(items)
+    store.save_snapshots(changed)
+    store.add_history(rows)
+
+async def flush_writes():
+    # Kopyalar döngüde alınır; depo yazması yürütücüde, döngü bu sırada çalışmaya devam eder
+    items = {k: copy.deepcopy(tracked_products[k]) for k in dirty_products if k in tracked_products}
+    dirty_products.clear()
+    changed = {k: copy.deepcopy(snapshots[k]) for k in dirty_snapshots if k in snapshots}
+    dirty_snapshots.clear()
+    rows = history_rows[:]
+    history_rows.clear()
+    if not (items or changed or rows): return
+    loop = asyncio.get_running_loop()
+    try: await loop.run_in_executor(None, write_batch, items, changed, rows)
+    except sqlite3.Error as e:
+        logger.error(f"Depo yazma hatası: {e}")
+        return
+    # Yazma sürerken silinen ürün eski kopyayla geri yazılmış olabilir; düzenlenen ürün sonraki turda yeniden yazılır
+    dirty_products.update(k for k, v in items.items() if k in tracked_products and tracked_products[k] != v)
+    for k in [k for k in items if k not in tracked_products]:
+        try: await loop.run_in_executor(None, store.delete_product, k)
+        except sqlite3.Error as e: logger.error(f"Depo silme hatası ({k}): {e}")
+
+def is_target_available(product: Dict, data: Dict) -> bool:
+    if product.get('category') == 'accessory':
+        return data['availability'] == 'in_stock'
+    if 'HEPSI' in product['target_sizes']:
+        return data['availability'] == 'in_stock'
+    return any(s.upper() in product['target_sizes'] for s in data['sizes'])
+
+async def notify_subscriber(context: ContextTypes.DEFAULT_TYPE, key: str, data: Dict, events: List[tuple], digest: str):
+    # Ürün bu arada silindiyse dokunma
+    if key not in tracked_products: return
+    product = tracked_products[key]
+
+    # Sadece başarılıysa saati güncelle
+    product['last_check'] = datetime.now()
+    # Bu takipçi aynı durumu zaten gördüyse değerlendirme ve yazma gereksiz
+    if product.get('snapshot') == digest: return
+    current_status = 'in_stock_target' if is_target_available(product, data) else 'out_of_stock'
+
+    if product['last_status'] == 'out_of_stock' and current_status == 'in_stock_target':
+        restocked = [e[1] for e in events if e[0] == 'size_restocked' and ('HEPSI' in product['target_sizes'] or e[1].upper() in product['target_sizes'])]
+        new_line = f"✨ Yeni gelen: {', '.join(restocked)}\n" if restocked and product.get('category') != 'accessory' else ""
+        caption = (f"🚨🚨 <b>AŞKIM KOŞ STOK GELDİ!</b> 🚨🚨\n\n💎 <b>{data['name']}</b>\n🎯 İstediğin: {', '.join(product['target_sizes'])}\n{new_line}👇 <b>HEMEN AL!</b>")
+        notifier.enqueue(context.bot, product['chat_id'], caption, product['url'], product.get('image'))
+
+    # Fiyat düşüşü
+    for event in events:
+        if event[0] != 'price_changed': continue
+        old_price, new_price = parse_price(event[1]), parse_price(event[2])
+        if old_price and new_price and new_price < old_price:
+            caption = (f"💸 <b>FİYAT DÜŞTÜ AŞKIM!</b>\n\n💎 <b>{data['name']}</b>\n🏷 <s>{event[1]}</s> ➜ <b>{event[2]}</b>")
+            notifier.enqueue(context.bot, product['chat_id'], caption, product['url'], product.get('image'))
+
+    product['last_status'] = current_status
+    product['price'] = data['price']
+    product['snapshot'] = digest
+    dirty_products.add(key)
+
+# Aynı ürünü bir kez çekip sonucu tüm takipçilere dağıtır
+async def check_product(context: ContextTypes.DEFAULT_TYPE, url: str, keys: List[str]):
+    data = await fetch_background(url)
+    mark_startup('first_check')
+    category = next((tracked_products[k].get('category', 'clothing') for k in keys if k in tracked_products), data['category'])
+    metrics.inc('zara_scrape_total', {'category': category, 'result': data.get('error', data['status'])})
+
+    # --- HATA DURUMU VE ZAMAN ---
+    if data['status'] == 'error':
+        # Hata varsa saati güncelleme, mesaj at (ama spam olmasın diye loga yazabilirsin)
+        # İstersen burayı aktif et: await context.bot.send_message(product['chat_id'], f"⚠️ Aşkım şu ürüne bakamadım: {product['name']}")
+        return data
+
+    pkey = product_key(url)
+    snapshot = snapshot_of(data)
+    digest = snapshot_hash(snapshot)
+    previous = snapshots.get(pkey)
+    events: List[tuple] = []
+    if previous is None or previous['hash'] != digest:
+        events = diff_snapshots(previous['data'] if previous else None, snapshot)
+        if events: logger.info(f"Değişiklik ({pkey}): {events}")
+        snapshots[pkey] = {'hash': digest, 'data': snapshot}
+        dirty_snapshots.add(pkey)
+        history_rows.append((pkey, datetime.now().isoformat(), data['status'], data['availability'], ",".join(data['sizes'])))
+
+    for key in keys:
+        try: await notify_subscriber(context, key, data, events, digest)
+        except Exception as e:
+            metrics.inc('zara_notification_errors_total')
+            logger.error(f"Bildirim hatası ({key}): {e}")
+    return data
+
+def build_product_index() -> Dict[str, Dict]:
+    index: Dict[str, Dict] = {}
+    for key, product in tracked_products.items():
+        pkey = product_key(product['url'])
+        entry = index.setdefault(pkey, {'url': normalize_url(product['url']), 'keys': [], 'users': []})
+        entry['keys'].append(key)
+        if product.get('user_id') not in entry['users']: entry['users'].append(product.get('user_id'))
+    return index
+
 async def check_job(context: ContextTypes.DEFAULT_TYPE):
+    global check_job_running
     if not tracked_products: return
-    for key, product in list(tracked_products.items()):
-        try:
-            data = await check_stock_selenium(product['url'])
-            
-            # --- HATA DURUMU VE ZAMAN ---
-            if data['status'] == 'error':
-                # Hata varsa saati güncelleme, mesaj at (ama spam olmasın diye loga yazabilirsin)
-                # İstersen burayı aktif et: await context.bot.send_message(product['chat_id'], f"⚠️ Aşkım şu ürüne bakamadım: {product['name']}")
-                continue 
-            
-            # Sadece başarılıysa saati güncelle
-            tracked_products[key]['last_check'] = datetime.now()
-
-            is_target_found = False
-            if product.get('category') == 'accessory':
-                is_target_found = (data['availability'] == 'in_stock')
-            else:
-                if 'HEPSI' in product['target_sizes']:
-                    if data['availability'] == 'in_stock': is_target_found = True
-                else:
-                    found = [s for s in data['sizes'] if s.upper() in product['target_sizes']]
-                    if found: is_target_found = True
-            
-            current_status = 'in_stock_target' if is_target_found else 'out_of_stock'
-
-            if product['last_status'] == 'out_of_stock' and current_status == 'in_stock_target':
-                caption = (f"🚨🚨 <b>AŞKIM KOŞ STOK GELDİ!</b> 🚨🚨\n\n💎 <b>{data['name']}</b>\n🎯 İstediğin: {', '.join(product['target_sizes'])}\n👇 <b>HEMEN AL!</b>")
-                keyboard = [[InlineKeyboardButton("🛒 SATIN AL", url=product['url'])]]
-                if product.get('image'):
-                    try: await context.bot.send_photo(product['chat_id'], photo=product['image'], caption=caption, parse_mode=ParseMode.HTML, reply_markup=InlineKeyboardMarkup(keyboard))
-                    except: await context.bot.send_message(product['chat_id'], text=caption, parse_mode=ParseMode.HTML, reply_markup=InlineKeyboardMarkup(keyboard))
-                else: await context.bot.send_message(product['chat_id'], text=caption, parse_mode=ParseMode.HTML, reply_markup=InlineKeyboardMarkup(keyboard))
-            
-            tracked_products[key]['last_status'] = current_status
-            await asyncio.sleep(5)
-        except: pass
+    # Önceki tur bitmeden yenisine başlama
+    if check_job_running:
+        logger.debug("Önceki kontrol turu hâlâ sürüyor, bu tur atlandı.")
+        return
+    index = build_product_index()
+    poll_scheduler.sync(index)
+    due = poll_scheduler.pop_due()
+    if not due: return
+
+    check_job_running = True
+    started = time.monotonic()
+
+    # Eşzamanlılık ve hız sınırı kontrol kuyruğunda uygulanır
+    async def worker(pkey):
+        entry = index[pkey]
+        data = {'status': 'error'}
+        try: data = await check_product(context, entry['url'], entry['keys'])
+        except Exception as e: logger.error(f"Kontrol hatası ({pkey}): {e}")
+        charge_users(entry['users'])
+        poll_scheduler.record(pkey, data)
+
+    try:
+        await asyncio.gather(*(worker(p) for p in due))
+    finally:
+        await flush_writes()
+        timings.maybe_log()
+        check_job_running = False
+        duration = time.monotonic() - started
+        backlog = poll_scheduler.backlog()
+        last_cycle.update({'duration': duration, 'products': len(tracked_products), 'unique': len(index),
+                           'checked': len(due), 'backlog': backlog, 'finished': datetime.now()})
+        if duration > SCHEDULER_TICK: metrics.inc('zara_check_cycle_overrun_total')
+        log = logger.warning if duration > SCHEDULER_TICK or backlog else logger.info
+        log(f"Kontrol turu: {len(due)}/{len(index)} tekil ürün kontrol edildi, {duration:.1f}sn, bekleyen {backlog}")
+
+# --- METRİKLER ---
+METRIC_HELP = {
+    'zara_scrape_total': ('counter', 'Ürün kontrolleri (kategori ve sonuca göre)'),
+    'zara_notification_errors_total': ('counter', 'Gönderilemeyen stok bildirimleri'),
+    'zara_check_cycle_overrun_total': ('counter', 'Tick süresini aşan kontrol turları'),
+    'zara_check_cycle_seconds': ('gauge', 'Son kontrol turunun süresi'),
+    'zara_check_tick_seconds': ('gauge', 'Kontrol turu aralığı'),
+    'zara_tracked_products': ('gauge', 'Takip edilen ürün (abonelik) sayısı'),
+    'zara_unique_products': ('gauge', 'Tekil ürün sayısı'),
+    'zara_poll_backlog': ('gauge', 'Zamanı gelmiş ama bekleyen ürün sayısı'),
+    'zara_scrape_queue_depth': ('gauge', 'Kontrol kuyruğunda sırada bekleyen iş sayısı'),
+    'zara_result_cache_size': ('gauge', 'Önbellekteki ürün sonucu sayısı'),
+    'zara_notify_queue_depth': ('gauge', 'Gönderilmeyi bekleyen bildirim sayısı'),
+    'zara_chrome_live': ('gauge', 'Açık Chrome sayısı'),
+    'zara_scraper_workers': ('gauge', 'Tarayıcı işçi süreci sayısı'),
+    'zara_startup_seconds': ('gauge', 'Açılıştan itibaren aşamalara kadar geçen süre (first_update, first_check)'),
+    'zara_stage_duration_seconds': ('histogram', 'Kontrol hattı aşama süreleri (notify = bildirim gönderimi)'),
+}
+
+def _labels(labels: Dict) -> str:
+    if not labels: return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in sorted(labels.items())) + '}'
+
+class Metrics:
+    def __init__(self):
+        self.counters: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, labels: Optional[Dict] = None, value: float = 1):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock: self.counters[key] = self.counters.get(key, 0) + value
+
+    def gauges(self) -> Dict[str, float]:
+        return {
+            'zara_check_cycle_seconds': last_cycle.get('duration', 0),
+            'zara_check_tick_seconds': SCHEDULER_TICK,
+            'zara_tracked_products': len(tracked_products),
+            'zara_unique_products': len(poll_scheduler.state),
+            'zara_poll_backlog': poll_scheduler.backlog(),
+            'zara_scrape_queue_depth': scrape_queue.depth(),
+            'zara_result_cache_size': len(result_cache),
+            'zara_notify_queue_depth': notifier.depth(),
+            'zara_chrome_live': driver_pool.live + (scraper_pool.chrome_live if scraper_pool else 0),
+            'zara_scraper_workers': len(scraper_pool.workers) if scraper_pool else 0,
+        }
+
+    def render(self) -> str:
+        samples: Dict[str, List[str]] = {}
+        with self._lock:
+            for (name, labels), value in self.counters.items():
+                samples.setdefault(name, []).append(f"{name}{_labels(dict(labels))} {value}")
+        for name, value in self.gauges().items():
+            samples.setdefault(name, []).append(f"{name} {value}")
+        for phase, value in startup_marks.items():
+            samples.setdefault('zara_startup_seconds', []).append(f"zara_startup_seconds{_labels({'phase': phase})} {value}")
+        hist_name = 'zara_stage_duration_seconds'
+        for stage, hist in sorted(timings.snapshot().items()):
+            cumulative = 0
+            for bound, n in zip(list(LATENCY_BUCKETS) + ['+Inf'], hist['buckets']):
+                cumulative += n
+                samples.setdefault(hist_name, []).append(f"{hist_name}_bucket{_labels({'stage': stage, 'le': bound})} {cumulative}")
+            samples[hist_name].append(f"{hist_name}_sum{_labels({'stage': stage})} {hist['sum']}")
+            samples[hist_name].append(f"{hist_name}_count{_labels({'stage': stage})} {hist['count']}")
+        lines = []
+        for name, rows in samples.items():
+            kind, text = METRIC_HELP.get(name, ('untyped', name))
+            lines += [f"# HELP {name} {text}", f"# TYPE {name} {kind}"] + rows
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
+
+async def handle_metrics_request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        request_line = (await asyncio.wait_for(reader.readline(), 5)).decode('latin-1')
+        while (await asyncio.wait_for(reader.readline(), 5)) not in (b'\r\n', b'\n', b''): pass
+        path = request_line.split(' ')[1] if request_line.count(' ') >= 2 else ''
+        if path.split('?')[0] == '/metrics':
+            status, body = '200 OK', metrics.render().encode()
+        else:
+            status, body = '404 Not Found', b'not found\n'
+        writer.write(f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                     f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError): pass
+    finally:
+        writer.close()
+
+async def start_metrics_server():
+    timings.enabled = True # Histogramlar için aşama ölçümü gerekli
+    await asyncio.start_server(handle_metrics_request, '0.0.0.0', METRICS_PORT)
+    logger.info(f"Metrikler :{METRICS_PORT}/metrics adresinde")
+
+# --- AÇILIŞ ---
+# Çökme sonrası yeniden başlama süresini izlemek için: import, durum yükleme, ısınma, ilk işlenen
+# mesaj ve ilk biten ürün kontrolü BOOT_STARTED'dan itibaren saniye olarak tutulur.
+startup_marks: Dict[str, float] = {}
+warm_task: Optional[asyncio.Task] = None
+
+def mark_startup(phase: str):
+    if phase in startup_marks: return
+    startup_marks[phase] = round(time.perf_counter() - BOOT_STARTED, 3)
+    if phase in ('first_update', 'first_check'): logger.info(f"Açılış: {phase} {startup_marks[phase]:.2f}s")
+    if 'first_update' in startup_marks and 'first_check' in startup_marks and phase in ('first_update', 'first_check'):
+        logger.info("Açılış özeti: " + ", ".join(f"{k}={v:.2f}s" for k, v in startup_marks.items()))
+
+async def note_first_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    mark_startup('first_update')
+
+async def warm_http_client():
+    try:
+        await wait_rate_limit(WARM_URL)
+        await get_http_client().head(WARM_URL) # DNS + TLS el sıkışması ilk kontrolden önce bitsin
+    except httpx.HTTPError as e: logger.warning(f"HTTP ısınması başarısız: {e}")
+
+async def warm_browsers(count: int):
+    loop = asyncio.get_running_loop()
+    opened = await asyncio.gather(*(loop.run_in_executor(None, driver_pool.acquire, 0) for _ in range(min(count, driver_pool.size))), return_exceptions=True)
+    drivers = [d for d in opened if not isinstance(d, BaseException)]
+    for driver in drivers: driver_pool.release(driver)
+    if len(drivers) < len(opened): logger.warning(f"Tarayıcı önceden açılamadı: {next(d for d in opened if isinstance(d, BaseException))}")
+    mark_startup('browsers_warm')
+    logger.info(f"{len(drivers)} tarayıcı hazır")
 
 async def post_init(application: Application):
-    await application.bot.set_my_commands([BotCommand("start", "Başlat"), BotCommand("list", "Listem")])
+    global scraper_pool, warm_task
+    mark_startup('init')
+    load_state() # Kaydedilmiş ürünler polling başlamadan yüklenir
+    mark_startup('state_loaded')
+    asyncio.get_running_loop().run_in_executor(None, prune_profile_dirs)
+    notifier.start(application.bot)
+    if SCRAPER_WORKERS > 0:
+        scraper_pool = ScraperPool(SCRAPER_WORKERS, SCRAPE_TIMEOUT) # İşçiler PREWARM_BROWSERS kadar Chrome'u kendileri açar
+        scraper_pool.start()
+    elif PREWARM_BROWSERS:
+        warm_task = asyncio.create_task(warm_browsers(PREWARM_BROWSERS)) # Chrome açılışı polling'i bekletmesin
+    if METRICS_PORT: await start_metrics_server()
+    commands = [BotCommand("start", "Başlat"), BotCommand("list", "Listem"), BotCommand("import", "Toplu ekle"), BotCommand("export", "Listemi indir")]
+    results = await asyncio.gather(application.bot.set_my_commands(commands), warm_http_client(), return_exceptions=True)
+    if isinstance(results[0], Exception): logger.warning(f"Komutlar ayarlanamadı: {results[0]}")
+    mark_startup('ready')
+    logger.info(f"Hazır ({startup_marks['ready']:.2f}s, {len(tracked_products)} ürün)")
+
+async def post_shutdown(application: Application):
+    if warm_task and not warm_task.done(): warm_task.cancel()
+    if scraper_pool: await scraper_pool.close()
+    driver_pool.close()
+    if http_client: await http_client.aclose()
+    store.close()
 
 if __name__ == "__main__":
-    app = Application.builder().token(TELEGRAM_TOKEN).post_init(post_init).build()
+    if "--worker" in sys.argv:
+        try: asyncio.run(run_shard_worker())
+        except KeyboardInterrupt: pass
+        sys.exit(0)
+    mark_startup('imports')
+    app = Application.builder().token(TELEGRAM_TOKEN).post_init(post_init).post_shutdown(post_shutdown).build()
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("list", list_products))
     app.add_handler(CommandHandler("admin", admin_command)) 
+    app.add_handler(CommandHandler("import", import_command))
+    app.add_handler(CommandHandler("export", export_command))
+    app.add_handler(CallbackQueryHandler(admin_callback, pattern="^adm_"))
     app.add_handler(CallbackQueryHandler(button_callback))
-    app.add_handler(MessageHandler(filters.TEXT & (~filters.COMMAND), handle_message)) 
-    if app.job_queue: app.job_queue.run_repeating(check_job, interval=CHECK_INTERVAL, first=10)
+    app.add_handler(MessageHandler(filters.TEXT & (~filters.COMMAND), handle_message))
+    app.add_handler(MessageHandler(filters.Document.ALL, handle_document))
+    app.add_handler(TypeHandler(Update, note_first_update), group=1) # Asıl handler bittikten sonra çalışır 
+    if app.job_queue: app.job_queue.run_repeating(check_job, interval=SCHEDULER_TICK, first=FIRST_CHECK_DELAY)
     print("Final Bot Başladı 🚀...")
     app.run_polling()
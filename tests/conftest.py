@@ -0,0 +1,49 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(ROOT, 'tests', 'fixtures')
+sys.path.insert(0, ROOT)
+
+import bot
+
+def read_fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES, name), encoding='utf-8') as f:
+        return f.read()
+
+# Telegram nesnelerinin yalnızca el atılan alanları
+class StubQuery:
+    class message:
+        chat_id = 1
+        reply_markup = None
+
+    def __init__(self, data: str = "", user_id: str = bot.ADMIN_ID):
+        self.data = data
+        self.from_user = type('User', (), {'id': int(user_id)})()
+        self.edits = []
+
+    async def answer(self, *args, **kwargs): pass
+
+    async def edit_message_text(self, text, **kwargs):
+        self.edits.append((text, kwargs.get('reply_markup')))
+
+    async def edit_message_caption(self, caption=None, **kwargs):
+        self.edits.append((caption, kwargs.get('reply_markup')))
+
+class StubUpdate:
+    message = None # Callback güncellemelerinde mesaj yok
+
+    def __init__(self, query: StubQuery):
+        self.callback_query = query
+        self.effective_user = query.from_user
+
+class StubContext:
+    bot = None
+
+@pytest.fixture
+def memory_store(monkeypatch):
+    store = bot.Store(':memory:')
+    monkeypatch.setattr(bot, 'store', store)
+    return store
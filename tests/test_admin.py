@@ -0,0 +1,33 @@
+import asyncio
+
+import pytest
+
+import bot
+from conftest import StubQuery, StubUpdate
+
+def press(data: str, user_id: str = bot.ADMIN_ID) -> StubQuery:
+    query = StubQuery(data, user_id)
+    asyncio.run(bot.admin_callback(StubUpdate(query), None))
+    return query
+
+@pytest.fixture(autouse=True)
+def users(memory_store, monkeypatch):
+    monkeypatch.setattr(bot, 'known_users', {'7': {'name': 'Ayşe'}})
+
+def test_back_to_menu_edits_message():
+    query = press("adm_menu")
+    text, markup = query.edits[0]
+    assert text == bot.ADMIN_MENU_TEXT
+    assert markup.inline_keyboard[0][0].callback_data == "adm_list_users"
+
+def test_set_product_quota():
+    press("adm_set_p_25_7")
+    assert bot.known_users['7']['max_products'] == 25
+    assert bot.store.load_users()['7']['max_products'] == 25
+    press("adm_set_p_d_7")
+    assert 'max_products' not in bot.known_users['7']
+
+def test_non_admin_is_ignored():
+    query = press("adm_set_p_25_7", user_id="1")
+    assert query.edits == []
+    assert 'max_products' not in bot.known_users['7']
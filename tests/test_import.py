@@ -0,0 +1,57 @@
+import asyncio
+import json
+
+import bot
+
+A = "https://www.zara.com/tr/tr/saten-elbise-p02731168.html"
+B = "https://www.zara.com/tr/tr/deri-canta-p16012610.html"
+
+def test_text_lines_with_and_without_sizes():
+    text = f"elbise {A} s, m\n\nçanta: {B}\nbu satırda link yok https://example.com/x\n"
+    assert bot.parse_import_text(text) == [(A, ['S', 'M']), (B, ['HEPSI'])]
+
+def test_bare_links_file():
+    raw = f"{A}\r\n{B} tümü\r\n".encode()
+    assert bot.parse_import_file(raw, 'linkler.txt') == [(A, ['HEPSI']), (B, ['HEPSI'])]
+
+def test_csv_with_header():
+    raw = f"name,url,target_sizes\nElbise,{A},\"S,M\"\nÇanta,{B},\n,,\n".encode('utf-8-sig')
+    assert bot.parse_import_file(raw, 'export.csv') == [(A, ['S', 'M']), (B, ['HEPSI'])]
+
+def test_json_export_dict():
+    raw = json.dumps({'products': [{'url': A, 'target_sizes': ['s', 'l']}, {'url': B, 'sizes': 'xs m'},
+                                   {'name': 'linksiz'}]}).encode()
+    assert bot.parse_import_file(raw, 'export.json') == [(A, ['S', 'L']), (B, ['XS', 'M'])]
+
+def test_json_list_with_plain_links():
+    raw = json.dumps([A, {'url': B}, 42]).encode()
+    assert bot.parse_import_file(raw, 'liste.txt') == [(A, ['HEPSI']), (B, ['HEPSI'])]
+
+def test_bulk_import_leaves_room_for_polling(monkeypatch):
+    running, started, peak = {'bulk': 0}, [], []
+
+    async def check_stock(url):
+        kind = 'bulk' if '/bulk-' in url else 'poll'
+        started.append(kind)
+        if kind == 'bulk':
+            running['bulk'] += 1
+            peak.append(running['bulk'])
+        await asyncio.sleep(0.01)
+        if kind == 'bulk': running['bulk'] -= 1
+        return bot.empty_result()
+
+    async def no_wait(url): pass
+
+    monkeypatch.setattr(bot, 'check_stock', check_stock)
+    monkeypatch.setattr(bot, 'wait_rate_limit', no_wait)
+
+    async def go():
+        queue = bot.ScrapeQueue(2, 1)
+        bulk = [queue.fetch(f"https://www.zara.com/tr/tr/bulk-p{i:08d}.html", bot.PRIORITY_BULK) for i in range(20)]
+        poll = [queue.fetch(f"https://www.zara.com/tr/tr/poll-p{i:08d}.html", bot.PRIORITY_BACKGROUND) for i in range(4)]
+        await asyncio.gather(*bulk, *poll)
+
+    asyncio.run(go())
+    assert max(peak) == 1
+    # Taramalar içe aktarmanın bitmesini beklemez
+    assert started[:6].count('poll') >= 3
@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+
+import bot
+from conftest import StubContext, StubQuery
+
+URL = "https://www.zara.com/tr/tr/saten-elbise-p02731168.html"
+
+def page(sizes):
+    return {**bot.empty_result(), 'status': 'success', 'name': 'SATEN ELBİSE', 'price': '1.299,00 TL',
+            'sizes': sizes, 'availability': 'in_stock' if sizes else 'out_of_stock', 'category': 'clothing'}
+
+class StubNotifier:
+    def __init__(self):
+        self.sent = []
+
+    def enqueue(self, bot_, chat_id, caption, url, image):
+        self.sent.append((chat_id, caption))
+
+@pytest.fixture
+def tracked(memory_store, monkeypatch):
+    notifier = StubNotifier()
+    monkeypatch.setattr(bot, 'notifier', notifier)
+    monkeypatch.setattr(bot, 'tracked_products', {'k': {
+        'url': URL, 'name': '-', 'price': '-', 'image': None, 'last_status': 'out_of_stock',
+        'target_sizes': ['M'], 'chat_id': 1, 'user_id': '1', 'category': 'clothing'}})
+    monkeypatch.setattr(bot, 'snapshots', {})
+    return notifier
+
+def check(monkeypatch, data):
+    async def fetch(url): return data
+    monkeypatch.setattr(bot, 'fetch_background', fetch)
+    asyncio.run(bot.check_product(StubContext(), URL, ['k']))
+
+def test_restock_alert_after_refresh(tracked, monkeypatch):
+    check(monkeypatch, page(['S']))
+    asyncio.run(bot.apply_refresh(StubContext(), StubQuery(), 'k', page(['S']), bot.datetime.now()))
+    assert bot.tracked_products['k']['last_status'] == 'out_of_stock'
+    check(monkeypatch, page(['S']))
+    assert tracked.sent == []
+    check(monkeypatch, page(['S', 'M']))
+    assert len(tracked.sent) == 1
+    assert "Yeni gelen: M" in tracked.sent[0][1]
+
+def test_unchanged_page_alerts_once(tracked, monkeypatch):
+    check(monkeypatch, page(['M']))
+    check(monkeypatch, page(['M']))
+    assert len(tracked.sent) == 1
@@ -0,0 +1,111 @@
+import asyncio
+
+import httpx
+import pytest
+
+import bot
+from conftest import read_fixture
+
+BASE = "https://www.zara.com/tr/tr/"
+
+def parse(name: str, query: str = ''):
+    return bot.parse_product_page(read_fixture(name), BASE + name.split('/')[-1] + query)
+
+# --- viewPayload ---
+def test_view_payload_first_color():
+    data = parse('pages/saten-elbise-p02731168.html')
+    assert data['status'] == 'success'
+    assert data['name'] == 'SATEN ELBİSE'
+    assert data['price'] == '1.299,00 TL'
+    assert data['sizes'] == ['XS', 'M'] # low_on_stock stokta sayılır, back_soon sayılmaz
+    assert data['availability'] == 'in_stock'
+    assert data['category'] == 'clothing'
+    assert data['image'].endswith('2731168800_1_1_1.jpg')
+
+def test_view_payload_selected_color():
+    data = parse('pages/saten-elbise-p02731168.html', '?v1=318553212')
+    assert data['sizes'] == ['S']
+    assert data['price'] == '1.399,00 TL'
+
+def test_view_payload_string_price():
+    data = parse('pages/basic-tisort-p00858401.html')
+    assert data['price'] == '399,90 TL'
+    assert data['sizes'] == ['S']
+
+def test_format_price_non_numeric():
+    assert bot.format_price('1.299,00 TL', divisor=100) == '1.299,00 TL'
+
+# --- JSON-LD ---
+def test_json_ld_sizes_from_graph():
+    data = parse('pages/straight-jean-p05575022.html')
+    assert data['status'] == 'success'
+    assert data['category'] == 'jeans'
+    assert data['sizes'] == ['36', '38']
+    assert data['price'] == '999,95 TL'
+
+def test_json_ld_accessory_without_size():
+    data = parse('pages/deri-canta-p16012610.html')
+    assert data['category'] == 'accessory'
+    assert data['sizes'] == ['Standart']
+    assert data['availability'] == 'in_stock'
+    assert data['price'] == '2.299,00 TL'
+
+# --- Çözülemeyen sayfalar Selenium'a bırakılır ---
+@pytest.mark.parametrize('name', ['broken/no-size-json-ld.html', 'broken/access-denied.html', 'broken/unparseable-payload.html'])
+def test_unusable_pages_return_none(name):
+    assert parse(name) is None
+
+# --- check_stock: HTTP motoru ve Selenium yedeği ---
+@pytest.fixture
+def engine(monkeypatch):
+    calls = []
+
+    async def fake_selenium(url):
+        calls.append(url)
+        return {**bot.empty_result(), 'status': 'success', 'name': 'SELENIUM'}
+
+    def use(handler):
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        monkeypatch.setattr(bot, 'http_client', client)
+        return client
+
+    monkeypatch.setattr(bot, 'FETCH_ENGINE', 'http')
+    monkeypatch.setattr(bot, 'check_stock_selenium', fake_selenium)
+    return use, calls
+
+def serve_fixture(name: str, status: int = 200):
+    return lambda request: httpx.Response(status, text=read_fixture(name))
+
+def run_check(client, url: str):
+    async def go():
+        try: return await bot.check_stock(url)
+        finally: await client.aclose()
+    return asyncio.run(go())
+
+def test_check_stock_uses_http_result(engine):
+    use, calls = engine
+    client = use(serve_fixture('pages/saten-elbise-p02731168.html'))
+    data = run_check(client, BASE + 'saten-elbise-p02731168.html')
+    assert data['name'] == 'SATEN ELBİSE'
+    assert calls == []
+
+@pytest.mark.parametrize('name', ['broken/no-size-json-ld.html', 'broken/access-denied.html', 'broken/unparseable-payload.html'])
+def test_check_stock_falls_back_on_unusable_page(engine, name):
+    use, calls = engine
+    client = use(serve_fixture(name))
+    data = run_check(client, BASE + 'x-p1.html')
+    assert data['name'] == 'SELENIUM'
+    assert calls == [BASE + 'x-p1.html']
+
+def test_check_stock_falls_back_on_http_status(engine):
+    use, calls = engine
+    client = use(serve_fixture('broken/access-denied.html', status=403))
+    assert run_check(client, BASE + 'x-p1.html')['name'] == 'SELENIUM'
+
+def test_check_stock_falls_back_on_parser_error(engine, monkeypatch):
+    use, calls = engine
+    client = use(serve_fixture('pages/saten-elbise-p02731168.html'))
+    def broken_parser(page, url): raise TypeError("bozuk")
+    monkeypatch.setattr(bot, 'parse_product_page', broken_parser)
+    assert run_check(client, BASE + 'x-p1.html')['name'] == 'SELENIUM'
+    assert len(calls) == 1
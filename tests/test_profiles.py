@@ -0,0 +1,77 @@
+import os
+import socket
+import time
+
+import bot
+
+def fake_chrome_lock(path, pid, host=None):
+    os.makedirs(path, exist_ok=True)
+    os.symlink(f"{host or socket.gethostname()}-{pid}", os.path.join(path, "SingletonLock"))
+
+def test_claimed_profile_is_not_shared(tmp_path):
+    base = str(tmp_path / "main-0")
+    first, first_claim = bot.claim_profile(base)
+    second, second_claim = bot.claim_profile(base)
+    assert first == base
+    assert second == base + "-1"
+    first_claim.close()
+    again, again_claim = bot.claim_profile(base)
+    assert again == base
+    second_claim.close()
+    again_claim.close()
+
+def test_stale_chrome_lock_is_removed(tmp_path):
+    base = str(tmp_path / "main-0")
+    fake_chrome_lock(base, 2 ** 22 + 12345) # pid_max üstü: yaşayan süreç olamaz
+    path, claim = bot.claim_profile(base)
+    assert path == base
+    assert not os.path.lexists(os.path.join(base, "SingletonLock"))
+    claim.close()
+
+def test_live_chrome_lock_is_kept(tmp_path):
+    base = str(tmp_path / "main-0")
+    fake_chrome_lock(base, os.getpid())
+    path, claim = bot.claim_profile(base)
+    assert path == base + "-1"
+    assert os.path.lexists(os.path.join(base, "SingletonLock"))
+    claim.close()
+
+def test_lock_from_recreated_container_is_removed(tmp_path):
+    base = str(tmp_path / "main-0")
+    fake_chrome_lock(base, 7, host="3f2a9c1b7d4e") # Eski konteynerin hostname'i
+    path, claim = bot.claim_profile(base)
+    assert path == base
+    assert not os.path.lexists(os.path.join(base, "SingletonLock"))
+    claim.close()
+
+def age(path, days):
+    old = time.time() - days * 86400
+    os.utime(path, (old, old))
+
+def test_prune_removes_only_idle_foreign_nodes(tmp_path, monkeypatch):
+    monkeypatch.setattr(bot, 'CHROME_PROFILE_DIR', str(tmp_path))
+    monkeypatch.setattr(bot, 'NODE_ID', 'zara-bot')
+    monkeypatch.setattr(bot, 'PROFILE_RETENTION_DAYS', 7)
+    for node in ('zara-bot', 'old', 'busy', 'recent'):
+        _, claim = bot.claim_profile(str(tmp_path / node / "main-0"))
+        if node != 'busy': claim.close()
+        else: busy = claim
+        if node != 'recent':
+            age(tmp_path / node / "main-0.claim", 30)
+            age(tmp_path / node, 30)
+    legacy = tmp_path / "main-1" # NODE_ID öncesi düz profil
+    legacy.mkdir()
+    age(legacy, 30)
+    bot.prune_profile_dirs()
+    assert sorted(os.listdir(tmp_path)) == ['busy', 'recent', 'zara-bot']
+    busy.close()
+
+def test_failed_profile_claim_returns_slot(tmp_path, monkeypatch):
+    blocked = tmp_path / "readonly"
+    blocked.write_text("") # Klasör yerine dosya: makedirs hata verir
+    monkeypatch.setattr(bot, 'CHROME_PROFILE_DIR', str(blocked))
+    pool = bot.DriverPool(2, 5)
+    for _ in range(3):
+        try: pool.acquire(timeout=0)
+        except OSError: pass
+    assert sorted(pool._free_slots) == [0, 1]
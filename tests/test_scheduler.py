@@ -0,0 +1,38 @@
+import time
+
+import bot
+
+def scheduler(owners: dict, budget: int) -> bot.PollScheduler:
+    sched = bot.PollScheduler(180, 60, 3600, budget)
+    sched.sync({pkey: {'users': users} for pkey, users in owners.items()})
+    return sched
+
+def tick(sched: bot.PollScheduler, budget: int) -> list:
+    sched.budget, sched.updated = budget, time.monotonic()
+    return sched.pop_due()
+
+def test_light_user_is_served_in_first_tick():
+    owners = {f"a{i:03d}": ['heavy'] for i in range(300)}
+    owners['z001'] = ['light']
+    sched = scheduler(owners, 3)
+    due = tick(sched, 3)
+    assert len(due) == 3 and 'z001' in due
+    assert sched.backlog() == 298
+
+def test_shared_product_goes_to_lighter_lane():
+    owners = {f"a{i:03d}": ['heavy'] for i in range(300)}
+    owners['s001'] = ['heavy', 'light']
+    sched = scheduler(owners, 2)
+    assert sched._lane(sched.state['s001']) == 'light'
+    assert 's001' in tick(sched, 2)
+
+def test_lanes_rotate_between_ticks():
+    owners = {f"a{i:03d}": ['heavy'] for i in range(300)}
+    owners.update({'b001': ['orta'], 'b002': ['orta'], 'c001': ['hafif'], 'c002': ['hafif']})
+    sched = scheduler(owners, 2)
+    lane = {pkey: users[0] for pkey, users in owners.items()}
+    first, second, third = ([lane[p] for p in tick(sched, 2)] for _ in range(3))
+    assert first == ['heavy', 'orta']
+    # Önceki turda sıra almayan şerit öne geçer
+    assert second == ['hafif', 'heavy']
+    assert third == ['orta', 'hafif']
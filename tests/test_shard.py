@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+
+import bot
+
+URL = "https://www.zara.com/tr/tr/saten-elbise-p02731168.html"
+
+def ok(name):
+    return {**bot.empty_result(), 'status': 'success', 'name': name, 'sizes': ['S'], 'availability': 'in_stock'}
+
+@pytest.fixture
+def board(tmp_path, monkeypatch):
+    monkeypatch.setattr(bot, 'store', bot.Store(str(tmp_path / 'zara.db')))
+    monkeypatch.setattr(bot, 'result_cache', bot.ResultCache(10, 3600))
+    local = []
+
+    async def local_fetch(url, priority=bot.PRIORITY_BACKGROUND):
+        local.append(url)
+        return ok('YEREL')
+
+    monkeypatch.setattr(bot.scrape_queue, 'fetch', local_fetch)
+    board = bot.JobBoard(poll_interval=0.02, worker_check=0.02)
+    monkeypatch.setattr(bot, 'job_board', board)
+    yield board, local
+    bot.store.close()
+
+async def wait_for_workers(board):
+    for _ in range(100):
+        if board.has_workers(): return
+        await asyncio.sleep(0.01)
+    raise AssertionError("işçi görünmedi")
+
+def test_worker_result_is_delivered(board):
+    board, local = board
+
+    async def go():
+        bot.store.heartbeat('w1')
+        await wait_for_workers(board)
+        task = asyncio.create_task(bot.fetch_background(URL))
+        await asyncio.sleep(0.05)
+        (pkey, url), = bot.store.claim_jobs('w1', 5, 60)
+        bot.store.finish_job('w1', pkey, {**ok('İŞÇİ'), 'url': url})
+        return await asyncio.wait_for(task, 2)
+
+    assert asyncio.run(go())['name'] == 'İŞÇİ'
+    assert local == []
+
+def test_jobs_of_dead_worker_run_locally(board):
+    board, local = board
+
+    async def go():
+        bot.store.heartbeat('w1')
+        await wait_for_workers(board)
+        task = asyncio.create_task(bot.fetch_background(URL))
+        await asyncio.sleep(0.05)
+        assert bot.store.claim_jobs('w1', 5, 60)
+        with bot.store.conn: bot.store.conn.execute("UPDATE shard_workers SET heartbeat = 0") # işçi öldü
+        return await asyncio.wait_for(task, 2) # SHARD_JOB_TIMEOUT'u beklememeli
+
+    assert asyncio.run(go())['name'] == 'YEREL'
+    assert local == [URL]
+    assert bot.store.conn.execute("SELECT COUNT(*) FROM shard_jobs").fetchone()[0] == 0
+
+def flaky(monkeypatch, name, failures):
+    real = getattr(bot.store, name)
+    left = [failures]
+
+    def call(*args):
+        if left[0]:
+            left[0] -= 1
+            raise bot.sqlite3.OperationalError("database is locked")
+        return real(*args)
+
+    monkeypatch.setattr(bot.store, name, call)
+
+def test_worker_survives_locked_database(board, monkeypatch, tmp_path):
+    board, local = board
+    monkeypatch.setattr(bot, 'CHROME_PROFILE_DIR', str(tmp_path / 'profiles'))
+    flaky(monkeypatch, 'heartbeat', 1)
+    flaky(monkeypatch, 'claim_jobs', 2)
+    flaky(monkeypatch, 'finish_job', 1)
+    sleep = asyncio.sleep
+    monkeypatch.setattr(bot.asyncio, 'sleep', lambda delay: sleep(min(delay, 0.01)))
+
+    async def go():
+        bot.store.enqueue_jobs([(bot.product_key(URL), URL, bot.PRIORITY_BACKGROUND)])
+        worker = asyncio.create_task(bot.run_shard_worker())
+        try:
+            for _ in range(200):
+                results = bot.store.collect_results()
+                if results: return results
+                await sleep(0.05)
+        finally:
+            worker.cancel()
+            await asyncio.gather(worker, return_exceptions=True)
+
+    (pkey, result), = asyncio.run(go())
+    assert result['name'] == 'YEREL' and result['url'] == URL
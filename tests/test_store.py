@@ -0,0 +1,55 @@
+import asyncio
+import threading
+
+import bot
+
+def product(user_id: str, url: str) -> dict:
+    return {'url': url, 'name': '-', 'price': '-', 'image': None, 'last_status': 'out_of_stock',
+            'target_sizes': ['HEPSI'], 'chat_id': int(user_id), 'user_id': user_id, 'category': 'clothing'}
+
+def test_resave_keeps_list_order():
+    store = bot.Store(':memory:')
+    for key in ('1_a', '1_b', '1_c'):
+        store.save_product(key, product('1', f"https://www.zara.com/tr/tr/{key}-p1.html"))
+    updated = product('1', "https://www.zara.com/tr/tr/1_a-p1.html")
+    updated['last_status'] = 'in_stock_target'
+    store.save_product('1_a', updated)
+    assert store.user_product_keys('1') == ['1_a', '1_b', '1_c']
+    assert store.load_products()['1_a']['last_status'] == 'in_stock_target'
+
+def test_resave_user_keeps_row():
+    store = bot.Store(':memory:')
+    store.save_user('7', {'name': 'Ayşe'})
+    store.save_user('8', {'name': 'Zeynep'})
+    store.save_user('7', {'name': 'Ayşe', 'max_products': 25})
+    assert list(store.load_users()) == ['7', '8']
+    assert store.load_users()['7']['max_products'] == 25
+
+def test_flush_does_not_resurrect_deleted_product(memory_store, monkeypatch):
+    monkeypatch.setattr(bot, 'tracked_products', {'1_a': product('1', "https://www.zara.com/tr/tr/a-p1.html"),
+                                                  '1_b': product('1', "https://www.zara.com/tr/tr/b-p2.html")})
+    monkeypatch.setattr(bot, 'dirty_products', {'1_a', '1_b'})
+    write_batch = bot.write_batch
+
+    async def go():
+        loop = asyncio.get_running_loop()
+        deleted = threading.Event()
+
+        def delete():
+            del bot.tracked_products['1_a']
+            bot.store.delete_product('1_a')
+            bot.tracked_products['1_b']['last_status'] = 'in_stock_target'
+            deleted.set()
+
+        # Kullanıcı, tur yazması yürütücüde sürerken ürünü siler ve diğerini günceller
+        def slow_write(*args):
+            loop.call_soon_threadsafe(delete)
+            deleted.wait(5)
+            write_batch(*args)
+
+        monkeypatch.setattr(bot, 'write_batch', slow_write)
+        await bot.flush_writes()
+
+    asyncio.run(go())
+    assert list(memory_store.load_products()) == ['1_b']
+    assert bot.dirty_products == {'1_b'}